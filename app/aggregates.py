@@ -0,0 +1,195 @@
+"""
+Incrementally maintained penjualan totals per (kategori, size_range)
+
+The CSV ingest applies every insert, update and delete to the
+penjualan_aggregate table as a delta, so the clustering pipeline can read
+a few hundred aggregated rows instead of scanning every transaction.
+Rows with an unparseable size are kept under the "Unknown" size range, so
+the table always accounts for every penjualan row. penjualan_value_count
+holds the rows per distinct kategori / size / penjual / kota value the
+same way (the data counts stored with each result).
+
+dataset_version.aggregates_version records the dataset version both
+tables were last brought up to date for: a write that keeps them current
+sets it to the new version, and load_aggregated() rebuilds them from
+penjualan only when it lags behind (e.g. an upload ran before the tables
+existed, or penjualan was edited directly).
+"""
+from datetime import datetime
+import pandas as pd
+from sqlalchemy import select, insert, update, delete, func, bindparam, inspect
+from app.models import db, PenjualanAggregate, PenjualanValueCount, DatasetVersion, DATASET_VERSION_ID
+from app.data_access import load_penjualan
+from app.preprocessing import add_size_columns, SIZE_BIN_WIDTH
+
+# Size range width the table is maintained at (the pipeline default)
+AGGREGATE_BIN_WIDTH = SIZE_BIN_WIDTH
+
+GROUP_COLUMNS = ['kategori', 'size_range']
+SUM_COLUMNS = ['jumlah_terjual', 'total_harga', 'jumlah_transaksi']
+
+# Penjualan columns whose distinct values penjualan_value_count counts
+DISTINCT_COLUMNS = ('kategori', 'size', 'nama_penjual', 'kota_tujuan')
+
+
+def aggregates_enabled():
+    """True once migrate_add_penjualan_aggregate.py has created the tables and version column"""
+    inspector = inspect(db.session.connection())
+    tables = (PenjualanAggregate.__tablename__, PenjualanValueCount.__tablename__, DatasetVersion.__tablename__)
+    if not all(inspector.has_table(name) for name in tables):
+        return False
+    columns = {column['name'] for column in inspector.get_columns(DatasetVersion.__tablename__)}
+    return 'aggregates_version' in columns
+
+
+def aggregate_deltas(records, sign=1):
+    """Per-group deltas of penjualan rows being added (sign=1) or removed (sign=-1)
+
+    Args:
+        records: DataFrame with kategori, size, jumlah_terjual and total_harga
+    """
+    df = records[['kategori', 'size']].copy()
+    df = add_size_columns(df, AGGREGATE_BIN_WIDTH)
+    df['size_range'] = df['size_range'].astype(str)
+    df['jumlah_terjual'] = pd.to_numeric(records['jumlah_terjual'], errors='coerce').fillna(0) * sign
+    df['total_harga'] = pd.to_numeric(records['total_harga'], errors='coerce').fillna(0) * sign
+    df['jumlah_transaksi'] = sign
+    return df.groupby(GROUP_COLUMNS, dropna=False)[SUM_COLUMNS].sum().reset_index()
+
+
+def value_count_deltas(records, sign=1):
+    """Per-value row count deltas of DISTINCT_COLUMNS for penjualan rows being added or removed"""
+    frames = []
+    for column in DISTINCT_COLUMNS:
+        counts = records[column].dropna().value_counts()
+        frames.append(pd.DataFrame({'column_name': column, 'value': counts.index.tolist(),
+                                    'jumlah': counts.to_numpy() * sign}))
+    return pd.concat(frames, ignore_index=True)
+
+
+def _apply_deltas(table, deltas, key_columns, sum_columns, count_column):
+    """Add summed deltas to ``table`` in the caller's transaction
+
+    Existing rows (matched on ``key_columns`` exactly, case-sensitively like
+    pandas groupby) are updated in one executemany, new keys inserted, and rows whose ``count_column`` drops
+    to zero deleted.
+    """
+    if deltas.empty:
+        return
+    deltas = deltas.groupby(key_columns, dropna=False)[sum_columns].sum().reset_index()
+
+    existing = {tuple(getattr(row, col) for col in key_columns): row
+                for row in db.session.execute(select(table)).all()}
+
+    updates, inserts, removed = [], [], []
+    for values in deltas.itertuples(index=False):
+        key = tuple(None if pd.isna(value) else value for value in values[:len(key_columns)])
+        sums = {col: int(round(value)) for col, value in zip(sum_columns, values[len(key_columns):])}
+        row = existing.get(key)
+        if row is None:
+            inserts.append({**dict(zip(key_columns, key)), **sums})
+        elif int(getattr(row, count_column) or 0) + sums[count_column] <= 0:
+            removed.append(row.id)
+        else:
+            updates.append({'row_id': row.id, **{f'new_{col}': int(getattr(row, col) or 0) + sums[col]
+                                                 for col in sum_columns}})
+
+    if updates:
+        db.session.execute(
+            update(table).where(table.c.id == bindparam('row_id')).values(
+                **{col: bindparam(f'new_{col}') for col in sum_columns}),
+            updates)
+    if inserts:
+        db.session.execute(insert(table), inserts)
+    if removed:
+        db.session.execute(delete(table).where(table.c.id.in_(removed)))
+
+
+def apply_aggregate_deltas(deltas):
+    """Add deltas (from aggregate_deltas, possibly concatenated) to penjualan_aggregate"""
+    _apply_deltas(PenjualanAggregate.__table__, deltas, GROUP_COLUMNS, SUM_COLUMNS, 'jumlah_transaksi')
+
+
+def apply_value_count_deltas(deltas):
+    """Add deltas (from value_count_deltas, possibly concatenated) to penjualan_value_count"""
+    _apply_deltas(PenjualanValueCount.__table__, deltas, ['column_name', 'value'], ['jumlah'], 'jumlah')
+
+
+def clear_aggregates():
+    db.session.execute(delete(PenjualanAggregate.__table__))
+    db.session.execute(delete(PenjualanValueCount.__table__))
+
+
+def rebuild_aggregates():
+    """Recompute penjualan_aggregate and penjualan_value_count from the raw table (caller commits)"""
+    df = load_penjualan(('id', 'kategori', 'size', 'jumlah_terjual', 'total_harga', 'nama_penjual', 'kota_tujuan'))
+    clear_aggregates()
+    if not df.empty:
+        apply_aggregate_deltas(aggregate_deltas(df))
+        apply_value_count_deltas(value_count_deltas(df))
+    return len(df)
+
+
+def aggregates_current():
+    """Whether the aggregate tables were last updated for the current dataset version"""
+    table = DatasetVersion.__table__
+    row = db.session.execute(select(table.c.version, table.c.aggregates_version).where(
+        table.c.id == DATASET_VERSION_ID)).first()
+    return row is not None and row.aggregates_version == row.version
+
+
+def mark_aggregates_current():
+    """Record the aggregate tables as up to date for the current version (caller commits)"""
+    table = DatasetVersion.__table__
+    result = db.session.execute(update(table).where(table.c.id == DATASET_VERSION_ID).values(
+        aggregates_version=table.c.version))
+    if result.rowcount == 0:
+        db.session.execute(insert(table).values(id=DATASET_VERSION_ID, version=0, aggregates_version=0,
+                                                updated_at=datetime.utcnow()))
+
+
+def load_aggregated(bin_width=SIZE_BIN_WIDTH):
+    """Aggregated frame like aggregate_data_by_size_range, read from penjualan_aggregate
+
+    The tables are rebuilt first if their version lags behind dataset_version.
+
+    Returns:
+        DataFrame (kategori, size_range, jumlah_terjual, total_harga,
+        jumlah_transaksi) in the same group order as the raw aggregation,
+        or None when the table cannot be used (other bin width, or not
+        migrated yet) and the caller should aggregate the raw rows instead
+    """
+    if bin_width != AGGREGATE_BIN_WIDTH:
+        return None
+    try:
+        if not aggregates_enabled():
+            print('penjualan_aggregate missing, aggregating raw rows')
+            return None
+        if not aggregates_current():
+            print('penjualan_aggregate out of date, rebuilding from penjualan')
+            rebuild_aggregates()
+            mark_aggregates_current()
+            db.session.commit()
+        table = PenjualanAggregate.__table__
+        stmt = select(table.c.kategori, table.c.size_range, table.c.jumlah_terjual, table.c.total_harga,
+                      table.c.jumlah_transaksi).where(
+            table.c.size_range != 'Unknown', table.c.kategori.isnot(None), table.c.jumlah_transaksi > 0)
+        df = pd.read_sql(stmt, db.session.connection())
+    except Exception as e:
+        db.session.rollback()
+        print(f'Error reading penjualan_aggregate: {str(e)}')
+        return None
+
+    df['jumlah_terjual'] = df['jumlah_terjual'].astype('int64')
+    df['total_harga'] = df['total_harga'].astype('float64')
+    df['jumlah_transaksi'] = df['jumlah_transaksi'].astype('int64')
+    # Python string order, as groupby sorts (database collations may order differently)
+    return df.sort_values(GROUP_COLUMNS, kind='stable').reset_index(drop=True)
+
+
+def aggregated_data_counts():
+    """Distinct kategori / size / penjual / kota counts, read from penjualan_value_count"""
+    table = PenjualanValueCount.__table__
+    stmt = select(table.c.column_name, func.count()).where(table.c.jumlah > 0).group_by(table.c.column_name)
+    counts = dict(db.session.execute(stmt).all())
+    return {column: int(counts.get(column, 0)) for column in DISTINCT_COLUMNS}
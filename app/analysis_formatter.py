@@ -3,6 +3,7 @@ Format clustering results into category-tier analysis
 """
 import pandas as pd
 from app.models import Penjualan, KMeansResult, KMedoidsResult, KMeansClusterDetail, KMedoidsClusterDetail
+from app.preprocessing import add_size_columns
 import numpy as np
 
 
@@ -72,16 +73,7 @@ def get_analysis_by_category(labels, k=3):
     } for i, d in enumerate(data)])
     
     # Categorize by size range (5cm increments)
-    def get_size_range(size_str):
-        try:
-            size = float(size_str)
-            lower = int(size // 5) * 5
-            upper = lower + 5
-            return f"{lower}-{upper - 1} cm"
-        except:
-            return "Unknown"
-    
-    df['size_range'] = df['size'].apply(get_size_range)
+    add_size_columns(df)
     
     # Group by kategori_type (Standard/Non-Standard), then by cluster and size_range
     result = {}
@@ -121,7 +113,7 @@ def format_category_analysis(df, k=3):
         tier_name = tiers.get(cluster_id, f'Tier {cluster_id}')
         
         # Group by kategori and size_range, sum jumlah_terjual
-        grouped = cluster_df.groupby(['kategori', 'size_range'])['jumlah_terjual'].sum().sort_values(ascending=False)
+        grouped = cluster_df.groupby(['kategori', 'size_range'], observed=True)['jumlah_terjual'].sum().sort_values(ascending=False)
         
         items = []
         for (kategori, size_range), total in grouped.items():
@@ -0,0 +1,234 @@
+"""
+Process-level caches for prepared clustering inputs and fitted results
+
+Entries are keyed by the dataset_version row, which every write to the
+penjualan table bumps in the same transaction (bump_dataset_version), so
+a changed dataset never hits a stale entry. upload_csv / delete_data also
+clear the caches explicitly through invalidate_dataset_caches().
+"""
+import threading
+from datetime import datetime
+from collections import OrderedDict
+import numpy as np
+from sqlalchemy import select, insert, update, func, inspect
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from app.models import db, Penjualan, DatasetVersion, DATASET_VERSION_ID
+from app.data_access import load_penjualan
+from app.preprocessing import aggregate_data_by_size_range, SIZE_BIN_WIDTH
+from app.aggregates import load_aggregated, aggregated_data_counts
+from app.history import HISTORY_LEVELS
+
+# Feature matrices kept per process (least recently used evicted first)
+FEATURE_CACHE_SIZE = 8
+
+# Fitted results (and views derived from them) kept per process
+RESULT_CACHE_SIZE = 32
+
+# Features the K-Means / K-Medoids pipelines cluster on
+CLUSTERING_FEATURES = ('jumlah_terjual', 'jumlah_transaksi')
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache with hit / miss counters"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries),
+                    'maxsize': self.maxsize}
+
+
+feature_cache = LRUCache(FEATURE_CACHE_SIZE)
+result_cache = LRUCache(RESULT_CACHE_SIZE)
+
+
+def dataset_fingerprint():
+    """Cache key of the current penjualan data: the dataset_version counter
+
+    A single-row primary-key read. Falls back to a checksum scan of the
+    penjualan table until migrate_add_dataset_version.py has been run.
+    """
+    table = DatasetVersion.__table__
+    try:
+        with db.engine.connect() as connection:
+            version = connection.execute(select(table.c.version).where(table.c.id == DATASET_VERSION_ID)).scalar()
+    except (OperationalError, ProgrammingError):
+        return _scan_fingerprint()
+    return ('version', int(version or 0))
+
+
+def _scan_fingerprint():
+    """Row count, max id and column checksums of penjualan (full scan, pre-migration fallback)"""
+    table = Penjualan.__table__
+    stmt = select(func.count(table.c.id), func.max(table.c.id), func.sum(table.c.id),
+                  func.sum(table.c.jumlah_terjual), func.sum(table.c.total_harga),
+                  func.sum(func.length(table.c.size)), func.sum(func.length(table.c.kategori)))
+    with db.engine.connect() as connection:
+        row = connection.execute(stmt).one()
+    return tuple(str(value) for value in row)
+
+
+def bump_dataset_version():
+    """Advance dataset_version in the caller's transaction (with every penjualan change)"""
+    if not inspect(db.session.connection()).has_table(DatasetVersion.__tablename__):
+        return
+    table = DatasetVersion.__table__
+    result = db.session.execute(update(table).where(table.c.id == DATASET_VERSION_ID).values(
+        version=table.c.version + 1, updated_at=datetime.utcnow()))
+    if result.rowcount == 0:
+        db.session.execute(insert(table).values(id=DATASET_VERSION_ID, version=1, updated_at=datetime.utcnow()))
+
+
+def invalidate_dataset_caches():
+    """Drop every cached feature matrix and result (call after the penjualan table changes)"""
+    feature_cache.clear()
+    result_cache.clear()
+
+
+def cache_stats():
+    return {'features': feature_cache.stats(), 'results': result_cache.stats()}
+
+
+def _build_features(features, bin_width):
+    # Aggregated rows straight from penjualan_aggregate when it is migrated,
+    # otherwise aggregate the raw rows by size range
+    df_aggregated = load_aggregated(bin_width)
+    if df_aggregated is not None:
+        if df_aggregated.empty:
+            return None
+        data_counts = aggregated_data_counts()
+    else:
+        df = load_penjualan()
+        if df.empty:
+            return None
+        df_aggregated = aggregate_data_by_size_range(df, bin_width)
+        # Raw-data statistics stored with each result, so the raw frame need not be kept
+        data_counts = {
+            'kategori': int(df['kategori'].nunique()),
+            'size': int(df['size'].nunique()),
+            'nama_penjual': int(df['nama_penjual'].nunique()),
+            'kota_tujuan': int(df['kota_tujuan'].nunique())
+        }
+
+    # Prepare and normalize features for clustering (aggregated data)
+    X = df_aggregated[list(features)].values.astype(float)
+    X_mean = X.mean(axis=0)
+    X_std = X.std(axis=0)
+    X_normalized = (X - X_mean) / (X_std + 1e-8)
+    for array in (X, X_mean, X_std, X_normalized):
+        array.flags.writeable = False
+
+    return {
+        'data_aggregated': df_aggregated,
+        'X': X,
+        'X_mean': X_mean,
+        'X_std': X_std,
+        'X_normalized': X_normalized,
+        'data_counts': data_counts
+    }
+
+
+def get_features(features=CLUSTERING_FEATURES, bin_width=SIZE_BIN_WIDTH):
+    """Aggregated data and (normalized) feature matrix for clustering, cached
+
+    Returns:
+        dict with data_aggregated, X, X_mean, X_std, X_normalized,
+        data_counts and key, or None if the table is empty. Arrays are read-only and
+        data_aggregated is a fresh copy, so callers cannot corrupt the cache.
+    """
+    key = (dataset_fingerprint(), tuple(features), bin_width)
+    entry = feature_cache.get(key)
+    if entry is None:
+        entry = _build_features(features, bin_width)
+        if entry is None:
+            return None
+        # The key travels with the features so results fitted on them can be memoized
+        entry['key'] = key
+        feature_cache.put(key, entry)
+
+    entry = dict(entry)
+    entry['data_aggregated'] = entry['data_aggregated'].copy()
+    return entry
+
+
+def memoize(key, compute):
+    """Return the result cached under ``key``, computing and storing it on a miss"""
+    value = result_cache.get(key)
+    if value is None:
+        value = compute()
+        if value is not None:
+            result_cache.put(key, value)
+    return value
+
+
+class FitResult:
+    """Compact snapshot of a fitted KMeansManual / KMedoidsManual
+
+    Keeps what the pipelines and views read (labels, centers, score,
+    iteration history) but not the distance matrix or the generator. Exposes the same attribute names
+    as the model, so it can stand in for it.
+    """
+
+    _ATTRIBUTES = ('k', 'max_iterations', 'random_state', 'labels', 'centroids', 'medoids',
+                   'inertia', 'cost', 'n_iter', 'runs_summary', 'distance_evaluations_skipped')
+
+    def __init__(self, model):
+        for name in self._ATTRIBUTES:
+            if hasattr(model, name):
+                value = getattr(model, name)
+                if isinstance(value, np.ndarray):
+                    value = value.copy()
+                    value.flags.writeable = False
+                setattr(self, name, value)
+        # Already compact: labels are stored as deltas, at the level the fit asked for
+        self.iteration_history = model.iteration_history
+
+
+def cached_fit(features, model_class, params):
+    """Fit ``model_class(**params)`` on features['X_normalized'], memoized
+
+    The key is (dataset fingerprint, feature set, algorithm, every constructor
+    parameter but ``history``), i.e. it covers k, max_iterations and
+    random_state, so repeat requests and the iteration views reuse one fit.
+    ``history`` only changes what is recorded: an entry recorded at the
+    requested level or a more detailed one is reused, otherwise the fit is
+    rerun at the requested level and replaces it.
+    """
+    key = ('fit', features['key'], model_class.__name__,
+           tuple(sorted((name, value) for name, value in params.items() if name != 'history')))
+    level = HISTORY_LEVELS.index(params.get('history', 'full'))
+
+    cached = result_cache.get(key)
+    if cached is not None and HISTORY_LEVELS.index(cached.iteration_history.level) >= level:
+        return cached
+    model = model_class(**params)
+    model.fit(features['X_normalized'])
+    result = FitResult(model)
+    result_cache.put(key, result)
+    return result
@@ -0,0 +1,213 @@
+"""
+Cluster validity metrics shared by the K-Means and K-Medoids engines
+"""
+import numpy as np
+
+
+def _scatter(X, labels, centers, n_clusters):
+    """Average Euclidean distance of each cluster's points to its center"""
+    in_range = (labels >= 0) & (labels < n_clusters)
+    labels = labels[in_range]
+    distances = np.linalg.norm(X[in_range] - centers[labels], axis=1)
+    counts = np.bincount(labels, minlength=n_clusters)
+    sums = np.bincount(labels, weights=distances, minlength=n_clusters)
+    return np.divide(sums, counts, out=np.zeros(n_clusters), where=counts > 0)
+
+
+def _max_ratios(scatter, centers, same_group=None):
+    """Worst (S_i + S_j) / d(c_i, c_j) over j != i for every cluster i"""
+    separation = np.linalg.norm(centers[:, np.newaxis] - centers[np.newaxis, :], axis=2)
+    valid = separation > 0
+    if same_group is not None:
+        valid &= same_group
+    ratios = np.divide(scatter[:, np.newaxis] + scatter[np.newaxis, :], separation,
+                       out=np.zeros_like(separation), where=valid)
+    return ratios.max(axis=1)
+
+
+def davies_bouldin_index(X, labels, centers):
+    """Calculate Davies-Bouldin Index
+
+    Scatter terms come from np.bincount and the separation matrix from one
+    broadcast. As in the original loop implementation, the number of
+    clusters is the number of distinct labels, centers beyond that are
+    ignored and coincident centers are skipped.
+
+    Args:
+        X: data matrix (n, d)
+        labels: cluster label per point
+        centers: cluster centers (centroids, or X[medoids] for K-Medoids)
+    """
+    X = np.asarray(X, dtype=float)
+    labels = np.asarray(labels, dtype=np.int64)
+    n_clusters = len(np.unique(labels))
+    if n_clusters <= 1:
+        return 0.0
+
+    centers = np.asarray(centers, dtype=float)[:n_clusters]
+    scatter = _scatter(X, labels, centers, n_clusters)
+    return float(_max_ratios(scatter, centers).sum() / n_clusters)
+
+
+def davies_bouldin_index_batch(X, labelings, centers_list):
+    """Davies-Bouldin Index for several labelings of the same X in one call
+
+    All labelings are offset into one shared label space, so the scatter of
+    every cluster of every labeling comes from a single np.bincount and the
+    separations from a single broadcast (masked to pairs from the same
+    labeling). Used to score a whole k-sweep at once.
+
+    Returns:
+        list of DBI values, one per labeling
+    """
+    X = np.asarray(X, dtype=float)
+    n_samples = X.shape[0]
+    labelings = [np.asarray(labels, dtype=np.int64) for labels in labelings]
+    n_clusters = np.array([len(np.unique(labels)) for labels in labelings])
+    offsets = np.concatenate(([0], np.cumsum(n_clusters)[:-1]))
+    all_centers = np.vstack([np.asarray(centers, dtype=float)[:n].reshape(n, -1)
+                             for centers, n in zip(centers_list, n_clusters)])
+    group = np.repeat(np.arange(len(labelings)), n_clusters)
+
+    # Points whose label has no center (labels >= n_clusters) are left out, as before
+    stacked_labels = np.concatenate([
+        np.where((labels >= 0) & (labels < n), labels + offset, -1)
+        for labels, n, offset in zip(labelings, n_clusters, offsets)
+    ])
+    stacked_points = np.tile(np.arange(n_samples), len(labelings))
+    scatter = _scatter(X[stacked_points], stacked_labels, all_centers, len(all_centers))
+
+    worst = _max_ratios(scatter, all_centers, same_group=group[:, np.newaxis] == group[np.newaxis, :])
+    totals = np.bincount(group, weights=worst, minlength=len(labelings))
+    return [float(total / n) if n > 1 else 0.0 for total, n in zip(totals, n_clusters)]
+
+
+# Above this many points the silhouette / Dunn indices are estimated from a sample of rows
+SILHOUETTE_SAMPLE_THRESHOLD = 5000
+SILHOUETTE_SAMPLE_SIZE = 2000
+
+
+def calinski_harabasz_index(X, labels):
+    """Calculate Calinski-Harabasz Index (higher is better)
+
+    Between- and within-cluster dispersion around the cluster means, from
+    np.bincount per feature, so it is O(n * d) and needs no distance matrix.
+    """
+    X = np.asarray(X, dtype=float)
+    X = X.reshape(len(X), -1)
+    _, labels = np.unique(np.asarray(labels), return_inverse=True)
+    n_samples, n_clusters = len(X), labels.max() + 1
+    if n_clusters <= 1 or n_clusters >= n_samples:
+        return 0.0
+
+    counts = np.bincount(labels, minlength=n_clusters)
+    means = np.column_stack([np.bincount(labels, weights=X[:, f], minlength=n_clusters)
+                             for f in range(X.shape[1])]) / counts[:, np.newaxis]
+    between = float(np.sum(counts * np.sum((means - X.mean(axis=0)) ** 2, axis=1)))
+    within = float(np.sum((X - means[labels]) ** 2))
+    if within == 0:
+        return 1.0
+    return between * (n_samples - n_clusters) / (within * (n_clusters - 1))
+
+
+def _sample_rows(n_samples, sample_size, random_state):
+    """Rows the pairwise indices are evaluated on (all rows, or a sorted sample)"""
+    if sample_size is None or sample_size >= n_samples:
+        return np.arange(n_samples)
+    rng = np.random.default_rng(random_state)
+    return np.sort(rng.choice(n_samples, size=sample_size, replace=False))
+
+
+def pairwise_indices_batch(X, labelings, metric='euclidean', distance_matrix=None, sample_size=None,
+                           random_state=None, memory_budget_mb=64):
+    """Silhouette and Dunn indices for several labelings of the same X
+
+    Distances are streamed in row blocks (from ``distance_matrix`` when given,
+    otherwise computed on the fly), so memory stays O(n * block) and every
+    block is shared by all labelings. With ``sample_size`` only that many
+    rows are evaluated, each against all n points: the silhouette becomes an
+    unbiased estimate of the exact mean and the Dunn index an approximation.
+
+    Args:
+        X: data matrix (n, d)
+        labelings: list of label arrays
+        metric: 'euclidean' or 'manhattan' (ignored when distance_matrix is given)
+        distance_matrix: precomputed DistanceMatrix or (n, n) array of X
+        sample_size: rows to evaluate (None = all, exact)
+        random_state: seed for the row sample
+
+    Returns:
+        (silhouettes, dunns): lists with one value per labeling
+    """
+    from app.processing_kmedoids import pairwise_distances, rows_per_block
+
+    X = np.asarray(X, dtype=float)
+    X = X.reshape(len(X), -1)
+    n_samples = len(X)
+    matrix = getattr(distance_matrix, 'matrix', distance_matrix)
+    rows = _sample_rows(n_samples, sample_size, random_state)
+
+    # Compact labels to 0..k-1 and one-hot encode them for per-cluster distance sums
+    compact, one_hots, counts = [], [], []
+    for labels in labelings:
+        _, inverse = np.unique(np.asarray(labels), return_inverse=True)
+        compact.append(inverse)
+        one_hots.append(np.eye(inverse.max() + 1)[inverse])
+        counts.append(np.bincount(inverse))
+
+    silhouette_sums = np.zeros(len(labelings))
+    closest_apart = np.full(len(labelings), np.inf)
+    widest_within = np.zeros(len(labelings))
+
+    block = rows_per_block(n_samples, X.shape[1], X.itemsize, memory_budget_mb)
+    for start in range(0, len(rows), block):
+        block_rows = rows[start:start + block]
+        if matrix is not None:
+            distances = np.asarray(matrix[block_rows], dtype=float)
+        else:
+            distances = pairwise_distances(X[block_rows], X, metric)
+        row_idx = np.arange(len(block_rows))
+
+        for j, (labels, one_hot, count) in enumerate(zip(compact, one_hots, counts)):
+            if len(count) <= 1:
+                continue
+            own = labels[block_rows]
+            sums = distances @ one_hot
+
+            # a: mean distance to the rest of the own cluster, b: nearest other cluster
+            own_count = count[own]
+            a = sums[row_idx, own] / np.maximum(own_count - 1, 1)
+            means = sums / count
+            means[row_idx, own] = np.inf
+            b = means.min(axis=1)
+            denom = np.maximum(a, b)
+            s = np.divide(b - a, denom, out=np.zeros_like(a), where=denom > 0)
+            s[own_count == 1] = 0.0  # Singleton clusters score 0, as in sklearn
+            silhouette_sums[j] += s.sum()
+
+            same = own[:, np.newaxis] == labels[np.newaxis, :]
+            widest_within[j] = max(widest_within[j], distances[same].max())
+            closest_apart[j] = min(closest_apart[j], distances[~same].min())
+
+    silhouettes, dunns = [], []
+    for j, count in enumerate(counts):
+        if len(count) <= 1:
+            silhouettes.append(0.0)
+            dunns.append(0.0)
+            continue
+        silhouettes.append(float(silhouette_sums[j] / len(rows)))
+        dunns.append(float(closest_apart[j] / widest_within[j]) if widest_within[j] > 0 else 0.0)
+    return silhouettes, dunns
+
+
+def silhouette_index(X, labels, metric='euclidean', distance_matrix=None, sample_size=None,
+                     random_state=None):
+    """Mean silhouette coefficient (higher is better), see pairwise_indices_batch"""
+    silhouettes, _ = pairwise_indices_batch(X, [labels], metric, distance_matrix, sample_size, random_state)
+    return silhouettes[0]
+
+
+def dunn_index(X, labels, metric='euclidean', distance_matrix=None, sample_size=None, random_state=None):
+    """Dunn index: smallest between-cluster distance over largest cluster diameter (higher is better)"""
+    _, dunns = pairwise_indices_batch(X, [labels], metric, distance_matrix, sample_size, random_state)
+    return dunns[0]
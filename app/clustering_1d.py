@@ -0,0 +1,136 @@
+"""
+Exact clustering for one-dimensional data (Ckmeans.1d.dp style)
+
+In 1-D every optimal K-Means / K-Medians cluster is a contiguous run of the
+sorted values, so the optimum can be found by dynamic programming over the
+sorted data. Segment costs come from prefix sums in O(1), and the optimal
+split points are monotone, so each DP layer is solved by divide and conquer
+in O(n log n). The result is deterministic (no random initialization).
+"""
+import numpy as np
+
+
+def _segment_costs(x_sorted, objective):
+    """Return a vectorized cost(starts, end) for segments x_sorted[start:end]"""
+    prefix = np.concatenate(([0.0], np.cumsum(x_sorted)))
+
+    if objective == 'sse':
+        prefix_sq = np.concatenate(([0.0], np.cumsum(x_sorted ** 2)))
+
+        def cost(starts, end):
+            size = end - starts
+            total = prefix[end] - prefix[starts]
+            sse = (prefix_sq[end] - prefix_sq[starts]) - total * total / size
+            return np.maximum(sse, 0.0)
+
+        return cost
+
+    if objective == 'l1':
+        def cost(starts, end):
+            # Sum of absolute deviations from the (lower) median element
+            median = starts + (end - starts - 1) // 2
+            x_median = x_sorted[median]
+            left = x_median * (median - starts) - (prefix[median] - prefix[starts])
+            right = (prefix[end] - prefix[median + 1]) - x_median * (end - median - 1)
+            return left + right
+
+        return cost
+
+    raise ValueError(f"Unsupported objective: {objective}")
+
+
+def optimal_segments_1d(x, k, objective='sse'):
+    """Optimal partition of 1-D data into k contiguous segments
+
+    Args:
+        x: 1-D array of values
+        k: number of clusters (1 <= k <= len(x))
+        objective: 'sse' (K-Means) or 'l1' (K-Medians / K-Medoids)
+
+    Returns:
+        (order, bounds, cost) where ``order`` sorts x, segment c covers
+        ``order[bounds[c]:bounds[c + 1]]`` and ``cost`` is the optimal total.
+    """
+    x = np.asarray(x, dtype=float).ravel()
+    n_samples = len(x)
+    if not 1 <= k <= n_samples:
+        raise ValueError(f"k must be between 1 and {n_samples}, got {k}")
+
+    order = np.argsort(x, kind='stable')
+    x_sorted = x[order]
+    # Centering keeps the SSE prefix sums well conditioned
+    cost = _segment_costs(x_sorted - x_sorted.mean(), objective)
+
+    # best[i] = optimal cost of the first i sorted points with the current number of clusters
+    best = np.full(n_samples + 1, np.inf)
+    best[1:] = cost(np.zeros(n_samples, dtype=np.int64), np.arange(1, n_samples + 1))
+    splits = np.zeros((k, n_samples + 1), dtype=np.int64)
+
+    for layer in range(1, k):
+        current = np.full(n_samples + 1, np.inf)
+        # Divide and conquer, one recursion level at a time: every open
+        # interval of prefixes [lo, hi] with candidate splits [split_lo, split_hi]
+        # is solved at its midpoint in a single vectorized pass
+        lo = np.array([layer + 1])
+        hi = np.array([n_samples])
+        split_lo = np.array([layer])
+        split_hi = np.array([n_samples - 1])
+        while len(lo):
+            mid = (lo + hi) // 2
+            lengths = np.minimum(mid - 1, split_hi) - split_lo + 1
+            offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+            interval = np.repeat(np.arange(len(mid)), lengths)
+            starts = np.arange(lengths.sum()) - offsets[interval] + split_lo[interval]
+            values = best[starts] + cost(starts, mid[interval])
+
+            # First (leftmost) minimum of every interval
+            interval_min = np.minimum.reduceat(values, offsets)
+            at_min = np.flatnonzero(values == interval_min[interval])
+            _, first = np.unique(interval[at_min], return_index=True)
+            split = starts[at_min[first]]
+            current[mid] = interval_min
+            splits[layer, mid] = split
+
+            lo, hi = np.concatenate((lo, mid + 1)), np.concatenate((mid - 1, hi))
+            split_lo = np.concatenate((split_lo, split))
+            split_hi = np.concatenate((split, split_hi))
+            keep = lo <= hi
+            lo, hi, split_lo, split_hi = lo[keep], hi[keep], split_lo[keep], split_hi[keep]
+        best = current
+
+    bounds = [n_samples]
+    for layer in range(k - 1, 0, -1):
+        bounds.append(int(splits[layer, bounds[-1]]))
+    bounds.append(0)
+    return order, np.array(bounds[::-1]), float(best[n_samples])
+
+
+def _segment_labels(order, bounds):
+    labels = np.empty(len(order), dtype=np.int64)
+    for cluster in range(len(bounds) - 1):
+        labels[order[bounds[cluster]:bounds[cluster + 1]]] = cluster
+    return labels
+
+
+def kmeans_1d(x, k):
+    """Exact 1-D K-Means: returns (labels, centroids of shape (k, 1), inertia)"""
+    x = np.asarray(x, dtype=float).ravel()
+    order, bounds, _ = optimal_segments_1d(x, k, objective='sse')
+    labels = _segment_labels(order, bounds)
+    centroids = np.array([[x[order[bounds[c]:bounds[c + 1]]].mean()] for c in range(k)])
+    inertia = float(np.sum((x - centroids[labels, 0]) ** 2))
+    return labels, centroids, inertia
+
+
+def kmedoids_1d(x, k):
+    """Exact 1-D K-Medoids: returns (labels, medoid indices into x, cost)
+
+    The medoid of each segment is its lower median element, which is also
+    the optimal 1-D K-Medians center, so the solution is optimal for both.
+    """
+    x = np.asarray(x, dtype=float).ravel()
+    order, bounds, _ = optimal_segments_1d(x, k, objective='l1')
+    labels = _segment_labels(order, bounds)
+    medoids = np.array([order[bounds[c] + (bounds[c + 1] - bounds[c] - 1) // 2] for c in range(k)])
+    cost = float(np.sum(np.abs(x - x[medoids][labels])))
+    return labels, medoids, cost
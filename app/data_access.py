@@ -0,0 +1,57 @@
+"""
+Columnar data access for the clustering pipeline
+
+Reads only the requested Penjualan columns with a Core select() and
+pd.read_sql in chunks, instead of hydrating one ORM object per row and
+rebuilding a DataFrame from per-row dicts.
+"""
+import pandas as pd
+from sqlalchemy import select
+from app.models import db, Penjualan
+
+# Columns used by the clustering pipeline (process_kmeans_manual / process_kmedoids_manual)
+PENJUALAN_COLUMNS = ('id', 'kategori', 'size', 'jumlah_terjual', 'harga_satuan',
+                     'total_harga', 'nama_penjual', 'kota_tujuan')
+
+# Minimal columns needed to aggregate per size range
+AGGREGATION_COLUMNS = ('id', 'kategori', 'size', 'jumlah_terjual', 'total_harga')
+
+# Rows fetched per round trip
+DEFAULT_CHUNKSIZE = 10000
+
+# NULL numerics become 0, like the old `float(x) if x else 0` conversion
+_NUMERIC_COLUMNS = {
+    'id': 'int64',
+    'jumlah_terjual': 'int64',
+    'harga_satuan': 'float64',
+    'total_harga': 'float64',
+}
+
+
+def _typed(chunk):
+    """Give one chunk fixed dtypes so concatenated chunks stay compact"""
+    for column, dtype in _NUMERIC_COLUMNS.items():
+        if column in chunk:
+            chunk[column] = pd.to_numeric(chunk[column], errors='coerce').fillna(0).astype(dtype)
+    return chunk
+
+
+def load_penjualan(columns=PENJUALAN_COLUMNS, chunksize=DEFAULT_CHUNKSIZE):
+    """Load Penjualan rows as a DataFrame with one typed column per field
+
+    Args:
+        columns: Penjualan column names to select
+        chunksize: rows fetched per chunk
+
+    Returns:
+        DataFrame ordered by id (empty, with the requested columns, if no rows)
+    """
+    table = Penjualan.__table__
+    stmt = select(*[table.c[name] for name in columns]).order_by(table.c.id)
+
+    with db.engine.connect() as connection:
+        chunks = [_typed(chunk) for chunk in pd.read_sql(stmt, connection, chunksize=chunksize)]
+
+    if not chunks:
+        return pd.DataFrame(columns=list(columns))
+    return pd.concat(chunks, ignore_index=True)
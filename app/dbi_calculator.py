@@ -3,44 +3,28 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib
 matplotlib.use('Agg')  # Non-GUI backend
-from app.models import Penjualan
-from app.processing_kmeans import KMeansManual, davies_bouldin_index_manual as davies_bouldin_kmeans, aggregate_data_by_size_range
-from app.processing_kmedoids import KMedoidsManual, davies_bouldin_index_manual as davies_bouldin_kmedoids
+from app.cache import get_features
+from app.processing_kmeans import KMeansManual
+from app.processing_kmedoids import KMedoidsManual, DistanceMatrix
+from app.cluster_metrics import (davies_bouldin_index_batch, calinski_harabasz_index, pairwise_indices_batch,
+                                 SILHOUETTE_SAMPLE_THRESHOLD, SILHOUETTE_SAMPLE_SIZE)
+from app.parallel import run_shared_sweep
 import base64
+import os
+import tempfile
 from io import BytesIO
 
 
 def get_clustering_data():
     """Get data from database, aggregate per 5cm, and normalize it"""
     try:
-        # Get data from database
-        data = Penjualan.query.all()
-        if not data:
-            return None, None, None
-        
-        # Convert to DataFrame
-        df = pd.DataFrame([{
-            'id': d.id,
-            'kategori': d.kategori,
-            'size': d.size,
-            'jumlah_terjual': d.jumlah_terjual,
-            'harga_satuan': float(d.harga_satuan) if d.harga_satuan else 0,
-            'total_harga': float(d.total_harga) if d.total_harga else 0,
-            'nama_penjual': d.nama_penjual,
-            'kota_tujuan': d.kota_tujuan
-        } for d in data])
-        
         # AGREGASI DATA BERDASARKAN RENTANG UKURAN PER 5CM (seperti di processing_kmeans.py)
-        df = aggregate_data_by_size_range(df)
-        
-        # Prepare features for clustering
         # ✨ CLUSTERING HANYA BERDASARKAN VOLUME PENJUALAN (jumlah_terjual)
-        X = df[['jumlah_terjual']].values.astype(float)
-        
-        # Normalize
-        X_mean = X.mean(axis=0)
-        X_std = X.std(axis=0)
-        X_normalized = (X - X_mean) / (X_std + 1e-8)
+        # Cached until the penjualan data changes
+        features = get_features(('jumlah_terjual',))
+        if features is None:
+            return None, None, None
+        X_normalized, X_mean, X_std = features['X_normalized'], features['X_mean'], features['X_std']
         
         return X_normalized, X_mean, X_std
     except Exception as e:
@@ -48,16 +32,46 @@ def get_clustering_data():
         return None, None, None
 
 
-def calculate_dbi_comparison(k_min=2, k_max=10, max_iterations=100):
+def fit_for_k(X_normalized, algorithm, k, max_iterations, distance_matrix=None):
+    """Fit one (algorithm, k) pair of the sweep and return (labels, centers)"""
+    if algorithm == 'kmeans':
+        # KMeans clustering - EXACTLY like processing_kmeans.py
+        kmeans = KMeansManual(k=k, max_iterations=max_iterations, random_state=42, history='none')
+        kmeans.fit(X_normalized)
+        return kmeans.labels, kmeans.centroids
+
+    # KMedoids clustering - EXACTLY like processing_kmedoids.py
+    kmedoids = KMedoidsManual(k=k, max_iterations=max_iterations, random_state=42, swap='fasterpam',
+                              history='none')
+    kmedoids.fit(X_normalized, distance_matrix=distance_matrix)
+    return kmedoids.labels, X_normalized[kmedoids.medoids]
+
+
+def calculate_dbi_comparison(k_min=2, k_max=10, max_iterations=100, n_jobs=None):
     """
     Calculate Davies-Bouldin Index for both KMeans and KMedoids
     Using EXACTLY the same method as processing_kmeans.py
     
+    Every (algorithm, k) pair is independent, so the sweep is fanned out to a
+    process pool (n_jobs workers, None = one per K value but at most the CPU
+    count, 1 = serial). The normalized feature matrix is shared with the
+    workers through shared memory, and the
+    K-Medoids distance matrix is built once and memory-mapped for them.
+    
+    Silhouette, Calinski-Harabasz and Dunn indices are reported alongside
+    DBI. Silhouette and Dunn use the K-Medoids distance matrix when it was
+    built (Manhattan) and Euclidean distances otherwise; above
+    SILHOUETTE_SAMPLE_THRESHOLD points they are estimated from a sample.
+    
     Returns:
         dict with keys:
             - list_k: list of K values
             - list_dbi_kmeans: DBI scores for KMeans
             - list_dbi_kmedoids: DBI scores for KMedoids
+            - list_silhouette_kmeans / list_silhouette_kmedoids: silhouette scores
+            - list_calinski_harabasz_kmeans / list_calinski_harabasz_kmedoids: CH scores
+            - list_dunn_kmeans / list_dunn_kmedoids: Dunn indices
+            - silhouette_sampled: True if silhouette/Dunn were estimated from a sample
             - error: error message if any
     """
     try:
@@ -68,10 +82,6 @@ def calculate_dbi_comparison(k_min=2, k_max=10, max_iterations=100):
                 'message': 'No data available in database'
             }
         
-        list_k = []
-        list_dbi_kmeans = []
-        list_dbi_kmedoids = []
-        
         # Validate K range
         if k_min < 2 or k_max < k_min or k_max > 20:
             return {
@@ -79,27 +89,49 @@ def calculate_dbi_comparison(k_min=2, k_max=10, max_iterations=100):
                 'message': 'K minimal harus >= 2, K maksimal >= K minimal, dan <= 20'
             }
         
-        # Iterate through K values - EXACTLY like processing_kmeans.py
-        for k in range(k_min, k_max + 1):
-            # KMeans clustering - EXACTLY like processing_kmeans.py
-            kmeans = KMeansManual(k=k, max_iterations=max_iterations, random_state=42)
-            kmeans.fit(X_normalized)
-            dbi_kmeans = davies_bouldin_kmeans(X_normalized, kmeans.labels, kmeans.centroids)
-            
-            # KMedoids clustering - EXACTLY like processing_kmedoids.py
-            kmedoids = KMedoidsManual(k=k, max_iterations=max_iterations, random_state=42)
-            kmedoids.fit(X_normalized)
-            dbi_kmedoids = davies_bouldin_kmedoids(X_normalized, kmedoids.labels, kmedoids.medoids)
-            
-            list_k.append(k)
-            list_dbi_kmeans.append(float(dbi_kmeans))
-            list_dbi_kmedoids.append(float(dbi_kmedoids))
+        list_k = list(range(k_min, k_max + 1))
+        if n_jobs is None:
+            n_jobs = min(os.cpu_count() or 1, len(list_k))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # The distance matrix depends only on X: build it once for every K-Medoids fit.
+            # Single-feature data uses the exact 1-D solver, which needs no matrix.
+            distance_matrix = jobs = None
+            try:
+                if X_normalized.shape[1] > 1:
+                    path = None if n_jobs == 1 else os.path.join(tmp_dir, 'distance_matrix.npy')
+                    distance_matrix = DistanceMatrix(X_normalized, metric='manhattan', path=path)
+
+                jobs = [(algorithm, k, max_iterations, distance_matrix if algorithm == 'kmedoids' else None)
+                        for k in list_k for algorithm in ('kmeans', 'kmedoids')]
+                fits = run_shared_sweep(fit_for_k, X_normalized, jobs, n_jobs=n_jobs)
+                labelings = [labels for labels, _ in fits]
+
+                # Score the whole sweep in one batched DBI call
+                scores = davies_bouldin_index_batch(X_normalized, labelings, [centers for _, centers in fits])
+
+                # Silhouette and Dunn share one streamed pass over the distances for every fit
+                sampled = len(X_normalized) > SILHOUETTE_SAMPLE_THRESHOLD
+                silhouettes, dunns = pairwise_indices_batch(
+                    X_normalized, labelings, distance_matrix=distance_matrix,
+                    sample_size=SILHOUETTE_SAMPLE_SIZE if sampled else None, random_state=42)
+                calinski_harabasz = [calinski_harabasz_index(X_normalized, labels) for labels in labelings]
+            finally:
+                # Drop every reference to the memory-mapped matrix before tmp_dir is removed
+                # (Windows cannot delete a file that is still mapped)
+                distance_matrix = jobs = None
         
         return {
             'status': 'success',
             'list_k': list_k,
-            'list_dbi_kmeans': list_dbi_kmeans,
-            'list_dbi_kmedoids': list_dbi_kmedoids
+            'list_dbi_kmeans': scores[0::2],
+            'list_dbi_kmedoids': scores[1::2],
+            'list_silhouette_kmeans': silhouettes[0::2],
+            'list_silhouette_kmedoids': silhouettes[1::2],
+            'list_calinski_harabasz_kmeans': calinski_harabasz[0::2],
+            'list_calinski_harabasz_kmedoids': calinski_harabasz[1::2],
+            'list_dunn_kmeans': dunns[0::2],
+            'list_dunn_kmedoids': dunns[1::2],
+            'silhouette_sampled': sampled
         }
     
     except Exception as e:
@@ -0,0 +1,95 @@
+"""
+Iteration history recording for the clustering engines
+"""
+import numpy as np
+
+HISTORY_LEVELS = ('none', 'summary', 'centers', 'full')
+
+# Fields holding cluster centers, kept from the 'centers' level up
+CENTER_FIELDS = ('centroids', 'medoids', 'medoid_points')
+
+
+def _label_dtype(n_labels):
+    if n_labels <= np.iinfo(np.int8).max:
+        return np.int8
+    if n_labels <= np.iinfo(np.int16).max:
+        return np.int16
+    return np.int32
+
+
+class IterationHistory:
+    """Per-iteration records at a configurable level of detail
+
+    Levels:
+        'none': nothing is recorded (production fits and k-sweeps)
+        'summary': scalar fields only (iteration, cost, skipped evaluations, ...)
+        'centers': summary plus the cluster centers
+        'full': centers plus labels, stored as deltas: the first labeling in
+            full, then only (indices, new labels) of the points that changed,
+            in int8/int16 when k allows
+
+    Iterating yields one dict per iteration, as the old plain list did,
+    with 'labels' rebuilt from the deltas on the fly (None where no labels
+    were recorded or the level does not keep them).
+    """
+
+    def __init__(self, level='full'):
+        if level not in HISTORY_LEVELS:
+            raise ValueError(f"Unsupported history level: {level}")
+        self.level = level
+        self._records = []
+        self._label_changes = []  # Per record: None, or (indices, labels) vs the previous labeling
+        self._last_labels = None
+
+    def record(self, labels=None, **fields):
+        """Record one iteration; ``labels`` is the label array (or None)"""
+        if self.level == 'none':
+            return
+        if self.level == 'summary':
+            fields = {key: value for key, value in fields.items() if key not in CENTER_FIELDS}
+        self._records.append(fields)
+        if self.level != 'full':
+            return
+
+        if labels is None:
+            self._label_changes.append(None)
+            return
+        labels = np.asarray(labels)
+        if self._last_labels is None:
+            changed = np.arange(len(labels), dtype=np.int32)
+        else:
+            changed = np.flatnonzero(labels != self._last_labels).astype(np.int32)
+        dtype = _label_dtype(int(labels.max()) + 1 if len(labels) else 1)
+        self._label_changes.append((changed, labels[changed].astype(dtype)))
+        self._last_labels = labels.astype(dtype)
+
+    def __len__(self):
+        return len(self._records)
+
+    def __bool__(self):
+        return bool(self._records)
+
+    def __iter__(self):
+        current = None
+        for i, fields in enumerate(self._records):
+            entry = dict(fields)
+            entry['labels'] = None
+            if self.level == 'full':
+                change = self._label_changes[i]
+                if change is not None:
+                    indices, values = change
+                    if current is None:
+                        current = values.copy()
+                    else:
+                        current = current.astype(np.result_type(current, values))
+                        current[indices] = values
+                    entry['labels'] = current
+            yield entry
+
+    def __getitem__(self, index):
+        return list(self)[index]
+
+    def nbytes(self):
+        """Bytes held by the stored labels (centers and scalars not counted)"""
+        return sum(indices.nbytes + values.nbytes for indices, values in
+                   (change for change in self._label_changes if change is not None))
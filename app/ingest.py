@@ -0,0 +1,287 @@
+"""
+Bulk CSV ingest for the penjualan table (upload_csv and import_csv.py)
+
+The CSV is read in fixed-size chunks; each chunk's columns are parsed and
+validated as whole Series, rows that fail are reported instead of
+inserted, and the valid rows are written with executemany-sized Core
+insert batches. All chunks go into one transaction, and memory stays
+bounded by the chunk size whatever the file size.
+
+Modes: 'replace' swaps the whole table, 'append' adds every row and
+'upsert' updates rows whose natural key already exists and adds the rest.
+Every change is also applied to penjualan_aggregate and
+penjualan_value_count as a delta.
+"""
+import pandas as pd
+from sqlalchemy import select, insert, update, delete, bindparam
+from app.models import db, Penjualan
+from app.cache import invalidate_dataset_caches, bump_dataset_version
+from app.aggregates import (aggregates_enabled, aggregates_current, mark_aggregates_current, aggregate_deltas,
+                            apply_aggregate_deltas, value_count_deltas, apply_value_count_deltas,
+                            clear_aggregates)
+
+# CSV column -> penjualan column
+CSV_COLUMNS = {
+    'Tanggal_Terjual': 'tanggal_terjual',
+    'Kategori': 'kategori',
+    'Size': 'size',
+    'Jumlah_Terjual': 'jumlah_terjual',
+    'Harga_Satuan': 'harga_satuan',
+    'Total_Harga': 'total_harga',
+    'Nama_Penjual': 'nama_penjual',
+    'Kota_Tujuan': 'kota_tujuan',
+}
+REQUIRED_COLUMNS = tuple(CSV_COLUMNS)
+
+INGEST_MODES = ('replace', 'append', 'upsert')
+
+# A sale is identified by these columns in 'upsert' mode
+NATURAL_KEY = ('tanggal_terjual', 'kategori', 'size', 'nama_penjual', 'kota_tujuan')
+
+# Columns an upsert overwrites on an existing sale
+UPSERT_COLUMNS = ('jumlah_terjual', 'harga_satuan', 'total_harga')
+
+# Dates in the exported CSV look like 5/24/2024 (month/day/year)
+DATE_FORMAT = '%m/%d/%Y'
+
+# Rows per executemany round trip
+INSERT_BATCH_SIZE = 5000
+
+# CSV rows read, validated and inserted at a time
+CSV_CHUNKSIZE = 20000
+
+# "2,200,000" or "2.200.000": digit groups with ',' or '.' as thousands separator
+_GROUPED_NUMBER = r'^\d{1,3}(?:[.,]\d{3})+$'
+
+# Row errors returned to the client (all of them are counted)
+MAX_REPORTED_ERRORS = 100
+
+
+def normalize_columns(df):
+    """Strip the padding some exports put around header names (" Harga_Satuan ")"""
+    df.columns = [str(col).strip() for col in df.columns]
+    return df
+
+
+def missing_columns(df):
+    return [col for col in REQUIRED_COLUMNS if col not in df.columns]
+
+
+def parse_prices(values):
+    """Rupiah amounts to numbers (NaN where unparseable, 0 where empty)
+
+    Accepts "2,200,000", " 2.200.000 " and "2200000" in the same column:
+    separators are dropped only from values that are grouped in threes.
+    """
+    if pd.api.types.is_numeric_dtype(values):
+        return values.fillna(0).astype(float)
+    text = values.astype('string').str.strip()
+    grouped = text.str.match(_GROUPED_NUMBER, na=False)
+    text = text.where(~grouped, text.str.replace(r'[.,]', '', regex=True))
+    parsed = pd.to_numeric(text, errors='coerce')
+    return parsed.where(text.fillna('') != '', 0).astype(float)
+
+
+def parse_counts(values):
+    """Whole numbers (NaN where unparseable or fractional, 0 where empty)"""
+    text = values.astype('string').str.strip()
+    parsed = pd.to_numeric(text, errors='coerce').astype(float)
+    parsed = parsed.where(text.fillna('') != '', 0)
+    return parsed.where(parsed % 1 == 0)
+
+
+def parse_dates(values):
+    """Sale dates (NaT where missing or unparseable)"""
+    return pd.to_datetime(values.astype('string').str.strip(), format=DATE_FORMAT, errors='coerce')
+
+
+def _row_errors(df, column, bad):
+    """One report entry per bad row of ``column`` (row is the CSV line number)"""
+    return [{'row': int(idx) + 2, 'column': column, 'value': str(df.at[idx, column]),
+             'message': f'Invalid {column}'}
+            for idx in df.index[bad]]
+
+
+def prepare_records(df):
+    """Validate and convert a CSV frame into penjualan column values
+
+    Returns:
+        (records, errors): DataFrame of valid rows with penjualan column
+        names, and a list of {row, column, value, message} for the rest
+    """
+    out = pd.DataFrame(index=df.index)
+    for column in ('Kategori', 'Size', 'Nama_Penjual', 'Kota_Tujuan'):
+        values = df[column].astype('string').str.strip()
+        out[CSV_COLUMNS[column]] = values.astype(object).where(values.notna(), None)
+
+    parsed = {
+        'Tanggal_Terjual': parse_dates(df['Tanggal_Terjual']),
+        'Jumlah_Terjual': parse_counts(df['Jumlah_Terjual']),
+        'Harga_Satuan': parse_prices(df['Harga_Satuan']),
+        'Total_Harga': parse_prices(df['Total_Harga']),
+    }
+
+    errors = []
+    valid = pd.Series(True, index=df.index)
+    for column, values in parsed.items():
+        bad = values.isna().to_numpy()
+        errors.extend(_row_errors(df, column, bad))
+        valid &= ~bad
+    errors.sort(key=lambda error: error['row'])
+
+    out['tanggal_terjual'] = parsed['Tanggal_Terjual'].dt.date
+    out['jumlah_terjual'] = parsed['Jumlah_Terjual']
+    out['harga_satuan'] = parsed['Harga_Satuan']
+    out['total_harga'] = parsed['Total_Harga']
+    out = out[valid]
+    for column in ('jumlah_terjual', 'harga_satuan', 'total_harga'):
+        out[column] = out[column].round().astype('int64')
+    return out, errors
+
+
+def insert_records(records, batch_size=INSERT_BATCH_SIZE):
+    """Insert prepared records in executemany batches (caller commits)"""
+    table = Penjualan.__table__
+    columns = list(records.columns)
+    # Column-wise tolist() yields native Python values much faster than to_dict('records')
+    rows = [dict(zip(columns, values)) for values in zip(*(records[col].tolist() for col in columns))]
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(insert(table), rows[start:start + batch_size])
+    return len(rows)
+
+
+def _natural_keys(records):
+    return list(zip(*(records[col].tolist() for col in NATURAL_KEY)))
+
+
+def update_existing(records):
+    """Update sales whose natural key is already stored (upsert), in one executemany
+
+    Within ``records`` the last row of a repeated key wins. Existing rows are
+    looked up by the chunk's sale dates (indexed); if the table holds the
+    same key more than once, the oldest row is updated.
+
+    Returns:
+        (new_records, updated_new, updated_old): rows still to insert, and
+        the new / previous values of the updated rows (for the aggregate deltas)
+    """
+    records = records[~pd.Series(_natural_keys(records)).duplicated(keep='last').to_numpy()]
+    if records.empty:
+        return records, records, records
+
+    table = Penjualan.__table__
+    columns = [table.c.id] + [table.c[col] for col in NATURAL_KEY + UPSERT_COLUMNS]
+    stmt = select(*columns).where(
+        table.c.tanggal_terjual.in_(sorted(set(records['tanggal_terjual'])))).order_by(table.c.id)
+    existing = {}
+    for row in db.session.execute(stmt).all():
+        existing.setdefault(tuple(getattr(row, col) for col in NATURAL_KEY), row)
+
+    matches = [existing.get(key) for key in _natural_keys(records)]
+    matched = pd.Series([row is not None for row in matches], index=records.index)
+    old_rows = [row for row in matches if row is not None]
+    if not old_rows:
+        return records, records.iloc[:0], records.iloc[:0]
+
+    updated_new = records[matched]
+    updated_old = pd.DataFrame([{col: getattr(row, col) for col in ('kategori', 'size') + UPSERT_COLUMNS}
+                                for row in old_rows])
+    new_values = zip(*(updated_new[col].tolist() for col in UPSERT_COLUMNS))
+    db.session.execute(
+        update(table).where(table.c.id == bindparam('row_id')).values(
+            **{col: bindparam(f'new_{col}') for col in UPSERT_COLUMNS}),
+        [{'row_id': row.id, **{f'new_{col}': value for col, value in zip(UPSERT_COLUMNS, values)}}
+         for row, values in zip(old_rows, new_values)])
+    return records[~matched], updated_new, updated_old
+
+
+def ingest_chunks(chunks, mode='replace', batch_size=INSERT_BATCH_SIZE, progress=None):
+    """Validate and load CSV frames into penjualan in one transaction
+
+    With mode 'replace' the existing rows are deleted in the same
+    transaction, so a failed upload leaves the old data in place; 'append'
+    keeps them and 'upsert' updates the ones with a matching NATURAL_KEY.
+    The aggregate tables receive the same changes as deltas when they
+    exist and are current (otherwise the next load_aggregated() rebuilds
+    them). Only the current chunk is held in memory; row errors are
+    counted but only the first MAX_REPORTED_ERRORS are kept. Every CSV row
+    is accounted for: total_rows = inserted + updated + duplicates_merged
+    + error_count.
+
+    Args:
+        chunks: iterable of DataFrames with the CSV columns
+        mode: 'replace', 'append' or 'upsert'
+        progress: optional callback(report) called after every chunk
+
+    Returns:
+        dict with mode, total_rows, inserted, updated, duplicates_merged,
+        chunks, error_count and errors
+    """
+    if mode not in INGEST_MODES:
+        raise ValueError(f'Unsupported upload mode: {mode}')
+
+    report = {'mode': mode, 'total_rows': 0, 'inserted': 0, 'updated': 0, 'duplicates_merged': 0,
+              'chunks': 0, 'error_count': 0, 'errors': []}
+    try:
+        maintain_aggregates = aggregates_enabled() and (mode == 'replace' or aggregates_current())
+        for chunk in chunks:
+            chunk = normalize_columns(chunk)
+            missing = missing_columns(chunk)
+            if missing:
+                raise ValueError(f'Missing columns: {", ".join(missing)}')
+            if mode == 'replace' and report['chunks'] == 0:
+                # Columns check out: clear the old rows (same transaction)
+                db.session.execute(delete(Penjualan.__table__))
+                if maintain_aggregates:
+                    clear_aggregates()
+
+            records, errors = prepare_records(chunk)
+            deltas = []
+            if mode == 'upsert':
+                valid_rows = len(records)
+                records, updated_new, updated_old = update_existing(records)
+                report['updated'] += len(updated_new)
+                # Earlier rows of a key repeated within the chunk (the last one wins)
+                report['duplicates_merged'] += valid_rows - len(records) - len(updated_new)
+                if len(updated_new):
+                    deltas += [aggregate_deltas(updated_new), aggregate_deltas(updated_old, sign=-1)]
+            report['inserted'] += insert_records(records, batch_size)
+            if maintain_aggregates:
+                apply_aggregate_deltas(pd.concat(deltas + [aggregate_deltas(records)], ignore_index=True))
+                # Upserts never change the key columns, so only inserted rows add values
+                apply_value_count_deltas(value_count_deltas(records))
+
+            report['total_rows'] += len(chunk)
+            report['chunks'] += 1
+            report['error_count'] += len(errors)
+            report['errors'].extend(errors[:MAX_REPORTED_ERRORS - len(report['errors'])])
+
+            print(f"  Chunk {report['chunks']}: {report['inserted']} inserted, {report['updated']} updated, "
+                  f"{report['duplicates_merged']} merged of {report['total_rows']} rows...")
+            if progress is not None:
+                progress(report)
+        bump_dataset_version()
+        if maintain_aggregates:
+            mark_aggregates_current()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        invalidate_dataset_caches()
+    return report
+
+
+def ingest_dataframe(df, mode='replace', batch_size=INSERT_BATCH_SIZE):
+    """Validate ``df`` and load its valid rows into penjualan (see ingest_chunks)"""
+    return ingest_chunks([df], mode, batch_size)
+
+
+def ingest_csv(source, mode='replace', chunksize=CSV_CHUNKSIZE, batch_size=INSERT_BATCH_SIZE, progress=None):
+    """Stream a CSV file (path or file object) into penjualan ``chunksize`` rows at a time
+
+    Every column is read as text, so chunks never disagree on inferred
+    dtypes and mixed number formats are parsed in the same single pass.
+    """
+    chunks = pd.read_csv(source, chunksize=chunksize, dtype=str, skip_blank_lines=True)
+    return ingest_chunks(chunks, mode, batch_size, progress)
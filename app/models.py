@@ -8,7 +8,7 @@ class Penjualan(db.Model):
     __tablename__ = 'penjualan'
 
     id = db.Column(db.Integer, primary_key=True)
-    tanggal_terjual = db.Column(db.Date, nullable=False)
+    tanggal_terjual = db.Column(db.Date, nullable=False, index=True)
     kategori = db.Column(db.String(100))
     size = db.Column(db.String(50))
     jumlah_terjual = db.Column(db.Integer)
@@ -18,6 +18,48 @@ class Penjualan(db.Model):
     kota_tujuan = db.Column(db.String(100))
 
 
+# Primary key of the single dataset_version row
+DATASET_VERSION_ID = 1
+
+
+class DatasetVersion(db.Model):
+    """Single-row counter bumped in every transaction that changes penjualan (cache key)"""
+    __tablename__ = 'dataset_version'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    # Version penjualan_aggregate / penjualan_value_count were last brought up to date for
+    aggregates_version = db.Column(db.BigInteger)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class PenjualanAggregate(db.Model):
+    """Penjualan totals per (kategori, size_range), kept up to date by the CSV ingest"""
+    __tablename__ = 'penjualan_aggregate'
+    # No unique (kategori, size_range) constraint: groups are matched in Python, as the
+    # raw aggregation groups them, and the case-insensitive utf8mb4_general_ci collation
+    # would reject "standard" next to "Standard"
+
+    id = db.Column(db.Integer, primary_key=True)
+    kategori = db.Column(db.String(100))
+    size_range = db.Column(db.String(50))
+    jumlah_terjual = db.Column(db.BigInteger, default=0)
+    total_harga = db.Column(db.Numeric(20, 0), default=0)
+    jumlah_transaksi = db.Column(db.Integer, default=0)
+
+
+class PenjualanValueCount(db.Model):
+    """Rows per distinct kategori / size / nama_penjual / kota_tujuan value, kept up to date by the CSV ingest"""
+    __tablename__ = 'penjualan_value_count'
+    # No unique (column_name, value) constraint: values are matched in Python, and a
+    # case-insensitive collation would merge values that nunique() counts apart
+
+    id = db.Column(db.Integer, primary_key=True)
+    column_name = db.Column(db.String(20), nullable=False, index=True)
+    value = db.Column(db.String(100))
+    jumlah = db.Column(db.Integer, default=0)
+
+
 class KMeansResult(db.Model):
     __tablename__ = 'kmeans_result'
 
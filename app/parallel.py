@@ -0,0 +1,122 @@
+"""
+Process-pool helpers for running independent clustering fits in parallel
+"""
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+
+# Arrays attached from shared memory inside a worker process, by key
+_worker_arrays = {}
+_worker_segments = []
+
+
+def restart_seeds(random_state, n_init):
+    """Independent, reproducible seeds for each restart
+
+    Derived with np.random.SeedSequence.spawn, so every restart gets its own
+    stream regardless of which worker runs it or in what order.
+    """
+    children = np.random.SeedSequence(random_state).spawn(n_init)
+    return [int(child.generate_state(1)[0]) for child in children]
+
+
+def _fit_restart(model_class, params, X, seed, fit_kwargs=None):
+    """Worker: fit one restart and return the model without heavy caches"""
+    model = model_class(random_state=seed, **params)
+    model.fit(X, **(fit_kwargs or {}))
+    # Do not ship an n x n distance matrix back through the pipe
+    if getattr(model, 'distance_matrix', None) is not None:
+        model.distance_matrix = None
+    return model
+
+
+def run_restarts(model_class, params, X, n_init, random_state, score_attr, n_jobs=None,
+                 fit_kwargs=None):
+    """Fit ``n_init`` independent restarts and keep the one with the lowest score
+
+    Args:
+        model_class: KMeansManual or KMedoidsManual
+        params: constructor arguments shared by every restart (without random_state)
+        X: data matrix
+        n_init: number of restarts
+        random_state: master seed the per-restart seeds are derived from
+        score_attr: attribute to minimize ('inertia' or 'cost')
+        n_jobs: worker processes (None = CPU count, 1 = run serially)
+        fit_kwargs: extra keyword arguments for every fit (e.g. distance_matrix)
+
+    Returns:
+        (best_model, summary) where summary has one dict per restart
+    """
+    seeds = restart_seeds(random_state, n_init)
+    if n_jobs == 1 or n_init == 1:
+        models = [_fit_restart(model_class, params, X, seed, fit_kwargs) for seed in seeds]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            models = list(pool.map(_fit_restart, [model_class] * n_init, [params] * n_init,
+                                   [X] * n_init, seeds, [fit_kwargs] * n_init))
+
+    scores = [float(getattr(model, score_attr)) for model in models]
+    best = int(np.argmin(scores))
+    summary = [{
+        'run': i,
+        'seed': seed,
+        score_attr: score,
+        'n_iter': int(model.n_iter),
+        'best': i == best
+    } for i, (seed, score, model) in enumerate(zip(seeds, scores, models))]
+    return models[best], summary
+
+
+class SharedArray:
+    """A NumPy array copied once into shared memory
+
+    Workers attach to it by name instead of receiving a pickled copy with
+    every task. Use as a context manager so the segment is always unlinked.
+    """
+
+    def __init__(self, array):
+        array = np.ascontiguousarray(array)
+        self._segment = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        self.array = np.ndarray(array.shape, dtype=array.dtype, buffer=self._segment.buf)
+        self.array[...] = array
+        self.spec = (self._segment.name, array.shape, array.dtype.str)
+
+    def close(self):
+        self.array = None
+        self._segment.close()
+        self._segment.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _attach_shared(specs):
+    """Pool initializer: map every shared segment into this worker once"""
+    for key, (name, shape, dtype) in specs.items():
+        segment = shared_memory.SharedMemory(name=name)
+        _worker_segments.append(segment)
+        _worker_arrays[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=segment.buf)
+
+
+def _call_with_shared(func, key, job):
+    return func(_worker_arrays[key], *job)
+
+
+def run_shared_sweep(func, X, jobs, n_jobs=None):
+    """Evaluate ``func(X, *job)`` for every job, in order
+
+    X is placed in shared memory once and attached by each worker process,
+    so only the small job tuples and results cross the process boundary.
+    ``func`` must be a module-level function. n_jobs=1 runs in-process.
+    """
+    jobs = list(jobs)
+    if n_jobs == 1 or len(jobs) <= 1:
+        return [func(X, *job) for job in jobs]
+
+    with SharedArray(X) as shared:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_attach_shared,
+                                 initargs=({'X': shared.spec},)) as pool:
+            return list(pool.map(_call_with_shared, [func] * len(jobs), ['X'] * len(jobs), jobs))
@@ -0,0 +1,81 @@
+"""
+Preprocessing helpers shared by the K-Means and K-Medoids pipelines
+"""
+import numpy as np
+import pandas as pd
+
+# Width of the size ranges products are aggregated into (0-4, 5-9, ... for 5 cm)
+SIZE_BIN_WIDTH = 5
+
+
+def size_range_label(range_start, bin_width=SIZE_BIN_WIDTH):
+    return f"{range_start}-{range_start + bin_width - 1} cm"
+
+
+def parse_size(size_str):
+    """Size in cm of a size string (None if it cannot be parsed)
+
+    Every lowercase "cm" is dropped and the rest must be an int literal,
+    so "20 cm", "20cm" and "cm20" parse while "20 CM" and non-strings don't.
+    """
+    try:
+        return int(size_str.replace('cm', '').strip())
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def get_size_range(size_str, bin_width=SIZE_BIN_WIDTH):
+    """Size range label of a single size string ("Unknown" if it cannot be parsed)"""
+    size = parse_size(size_str)
+    if size is None:
+        return "Unknown"
+    return size_range_label(size // bin_width * bin_width, bin_width)
+
+
+def add_size_columns(df, bin_width=SIZE_BIN_WIDTH):
+    """Parse df['size'] into integer ``size_cm`` and categorical ``size_range`` columns
+
+    The column is factorized and only its distinct values go through
+    parse_size, so every row gets exactly the get_size_range label at one
+    Python call per distinct size. Unparseable sizes get a missing size_cm
+    and the "Unknown" size range. Categories are in label (string) order,
+    so groupby on size_range sorts groups exactly like the plain string
+    labels did.
+    """
+    codes, uniques = pd.factorize(df['size'])
+    sizes = [parse_size(value) for value in uniques] + [None]
+    # Missing sizes (code -1) take the trailing None / "Unknown" entry
+    codes = np.where(codes >= 0, codes, len(uniques))
+    # Sizes beyond int64 still get their label, only size_cm is left missing
+    df['size_cm'] = pd.array([size if size is None or abs(size) < 2**63 else None for size in sizes],
+                             dtype='Int64')[codes]
+
+    labels = np.array(["Unknown" if size is None else size_range_label(size // bin_width * bin_width, bin_width)
+                       for size in sizes], dtype=object)
+    categories, label_codes = np.unique(labels, return_inverse=True)
+    df['size_range'] = pd.Categorical.from_codes(label_codes[codes], categories=categories)
+    return df
+
+
+def aggregate_data_by_size_range(df, bin_width=SIZE_BIN_WIDTH):
+    """Aggregate data by size ranges (5cm by default) and category before clustering"""
+    # Parse sizes into size_cm / size_range columns (vectorized)
+    df = add_size_columns(df, bin_width)
+    
+    # Remove rows with Unknown size range
+    df = df[df['size_range'] != 'Unknown'].copy()
+    
+    # Aggregate by kategori and size_range
+    aggregated = df.groupby(['kategori', 'size_range'], observed=True).agg({
+        'jumlah_terjual': 'sum',  # Total units sold
+        'total_harga': 'sum',
+        'id': 'count'  # Count number of transactions
+    }).reset_index()
+    
+    # Rename 'id' column to 'jumlah_transaksi'
+    aggregated.rename(columns={'id': 'jumlah_transaksi'}, inplace=True)
+    
+    # Plain string labels for the JSON / database code downstream
+    aggregated['size_range'] = aggregated['size_range'].astype(str)
+    
+    return aggregated
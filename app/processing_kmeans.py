@@ -1,6 +1,12 @@
 ﻿import pandas as pd
 import numpy as np
-from app.models import db, Penjualan, KMeansResult, KMeansClusterDetail, KMeansFinalResult
+from app.models import db, KMeansResult, KMeansClusterDetail, KMeansFinalResult
+from app.cache import get_features, cached_fit
+from app.clustering_1d import kmeans_1d
+from app.parallel import run_restarts
+from app.cluster_metrics import davies_bouldin_index
+from app.history import IterationHistory
+from app.preprocessing import aggregate_data_by_size_range, get_size_range
 
 
 def convert_numpy_types(obj):
@@ -19,64 +25,191 @@ def convert_numpy_types(obj):
 
 
 class KMeansManual:
-    def __init__(self, k=3, max_iterations=10, random_state=42, tol=1e-4):
+    def __init__(self, k=3, max_iterations=10, random_state=42, tol=1e-4, exact_1d=True,
+                 init='k-means++', oversampling_factor=None, n_rounds=5, algorithm='lloyd',
+                 n_init=1, n_jobs=None, history='full'):
+        if init not in ('k-means++', 'greedy-k-means++', 'k-means||'):
+            raise ValueError(f"Unsupported init: {init}")
+        if algorithm not in ('lloyd', 'elkan', 'hamerly'):
+            raise ValueError(f"Unsupported algorithm: {algorithm}")
         self.k = k
         self.max_iterations = max_iterations
         self.random_state = random_state
         self.tol = tol
+        self.exact_1d = exact_1d  # Use the exact DP solver for single-feature data
+        self.init = init  # 'k-means++', 'greedy-k-means++' or 'k-means||'
+        self.oversampling_factor = oversampling_factor  # K-Means|| points per round, default 2k
+        self.n_rounds = n_rounds  # K-Means|| sampling rounds
+        # 'lloyd': full distance table every iteration
+        # 'elkan' / 'hamerly': triangle-inequality bounds skip most distance evaluations
+        self.algorithm = algorithm
+        self.n_init = n_init  # Independent restarts; the lowest inertia wins
+        self.n_jobs = n_jobs  # Worker processes for restarts (None = all CPUs, 1 = serial)
+        self.runs_summary = []  # One entry per restart when n_init > 1
+        self._rng = None  # np.random.Generator owned by this instance, created per fit
+        self.distance_evaluations_skipped = 0
+        self._upper = None  # Per-point upper bound on distance to own centroid
+        self._lower = None  # Lower bound(s) on distance to other centroids
         self.centroids = None
         self.labels = None
         self.inertia = None
-        self.iteration_history = []
+        # 'none', 'summary', 'centers' or 'full' (labels stored as per-iteration deltas)
+        self.history = history
+        self.iteration_history = IterationHistory(history)
         self.n_iter = 0  # Track actual iterations used
 
-    def _kmeans_plusplus_init(self, X):
-        """K-Means++ initialization for better centroid selection"""
-        np.random.seed(self.random_state)
+    def _init_centroids(self, X):
+        """Choose initial centroids with the configured seeding strategy"""
+        # Instance-owned generator: concurrent fits never touch global random state
+        self._rng = np.random.default_rng(self.random_state)
+        if self.init == 'k-means||':
+            return self._kmeans_parallel_init(X)
+        if self.init == 'greedy-k-means++':
+            return self._kmeans_plusplus_init(X, n_local_trials=2 + int(np.log(self.k)))
+        return self._kmeans_plusplus_init(X)
+
+    def _kmeans_plusplus_init(self, X, n_local_trials=1, weights=None):
+        """K-Means++ initialization for better centroid selection
+
+        Keeps a running minimum squared distance to the chosen centroids, so
+        each new centroid costs a single O(n) pass. With ``n_local_trials`` > 1
+        (greedy K-Means++) several candidates are sampled per step and the one
+        that lowers the potential most is kept. ``weights`` scales each point's
+        sampling probability (used by K-Means||).
+        """
         n_samples = X.shape[0]
-        centroids = []
-        
+        centroids = np.empty((self.k, X.shape[1]))
+
         # Choose first centroid randomly
-        first_idx = np.random.randint(n_samples)
-        centroids.append(X[first_idx].copy())
-        
+        if weights is None:
+            first_idx = self._rng.integers(n_samples)
+            weights = np.ones(n_samples)
+        else:
+            first_idx = self._rng.choice(n_samples, p=weights / weights.sum())
+        centroids[0] = X[first_idx]
+        min_dist_sq = ((X - centroids[0])**2).sum(axis=1)
+
         # Choose remaining k-1 centroids
-        for _ in range(self.k - 1):
-            # Calculate distance to nearest centroid
-            distances = np.array([np.min([np.linalg.norm(x - c) for c in centroids]) for x in X])
-            distances_sq = distances ** 2
-            
-            # Choose next centroid with probability proportional to distance squared
-            probabilities = distances_sq / distances_sq.sum()
-            next_idx = np.random.choice(n_samples, p=probabilities)
-            centroids.append(X[next_idx].copy())
-        
-        return np.array(centroids)
+        for c in range(1, self.k):
+            potential = weights * min_dist_sq
+            total = potential.sum()
+            # All points already coincide with a centroid: fall back to uniform sampling
+            probabilities = potential / total if total > 0 else np.full(n_samples, 1.0 / n_samples)
+
+            if n_local_trials == 1:
+                # Choose next centroid with probability proportional to distance squared
+                next_idx = self._rng.choice(n_samples, p=probabilities)
+                centroids[c] = X[next_idx]
+                min_dist_sq = np.minimum(min_dist_sq, ((X - centroids[c])**2).sum(axis=1))
+                continue
+
+            candidates = self._rng.choice(n_samples, size=n_local_trials, p=probabilities)
+            candidate_dist_sq = ((X - X[candidates][:, np.newaxis])**2).sum(axis=2)
+            candidate_min = np.minimum(min_dist_sq, candidate_dist_sq)
+            best = np.argmin((weights * candidate_min).sum(axis=1))
+            centroids[c] = X[candidates[best]]
+            min_dist_sq = candidate_min[best]
+
+        return centroids
+
+    def _kmeans_parallel_init(self, X):
+        """K-Means|| initialization (Bahmani et al. 2012)
+
+        Each round samples about ``oversampling_factor`` points at once with
+        probability proportional to their squared distance, instead of one
+        point per pass. The candidates are weighted by how many points they
+        attract and reduced to k centroids with weighted K-Means++.
+        """
+        n_samples = X.shape[0]
+        oversampling = self.oversampling_factor or 2 * self.k
+
+        candidates = [int(self._rng.integers(n_samples))]
+        min_dist_sq = ((X - X[candidates[0]])**2).sum(axis=1)
+        closest = np.zeros(n_samples, dtype=np.int64)
+
+        for _ in range(self.n_rounds):
+            potential = min_dist_sq.sum()
+            if potential == 0:
+                break
+            probabilities = np.minimum(1.0, oversampling * min_dist_sq / potential)
+            picked = np.flatnonzero(self._rng.random(n_samples) < probabilities)
+            if len(picked) == 0:
+                continue
+            picked_dist_sq = ((X - X[picked][:, np.newaxis])**2).sum(axis=2)
+            nearest_picked = np.argmin(picked_dist_sq, axis=0)
+            nearest_dist_sq = picked_dist_sq[nearest_picked, np.arange(n_samples)]
+            improved = nearest_dist_sq < min_dist_sq
+            closest[improved] = len(candidates) + nearest_picked[improved]
+            min_dist_sq = np.minimum(min_dist_sq, nearest_dist_sq)
+            candidates.extend(picked.tolist())
+
+        if len(candidates) < self.k:
+            # Too few candidates (e.g. many duplicate points): use plain K-Means++
+            return self._kmeans_plusplus_init(X)
+
+        weights = np.bincount(closest, minlength=len(candidates)).astype(float)
+        return self._kmeans_plusplus_init(X[candidates], weights=weights + 1e-12)
+
+    def _fit_1d(self, X):
+        """Exact, deterministic solution for single-feature data"""
+        self.labels, self.centroids, self.inertia = kmeans_1d(X[:, 0], self.k)
+        self.iteration_history.record(iteration=0, centroids=self.centroids.copy())
+        self.iteration_history.record(iteration=1, centroids=self.centroids.copy(), labels=self.labels)
+        self.n_iter = 1
+        print("K-Means solved exactly (1-D dynamic programming)")
+
+    def _restart_params(self):
+        """Constructor arguments shared by every restart"""
+        return {
+            'k': self.k, 'max_iterations': self.max_iterations, 'tol': self.tol,
+            'exact_1d': self.exact_1d, 'init': self.init,
+            'oversampling_factor': self.oversampling_factor, 'n_rounds': self.n_rounds,
+            'algorithm': self.algorithm, 'history': self.history
+        }
+
+    def _fit_restarts(self, X):
+        """Run n_init seeded restarts in a process pool and keep the best"""
+        best, self.runs_summary = run_restarts(KMeansManual, self._restart_params(), X, self.n_init,
+                                               self.random_state, 'inertia', self.n_jobs)
+        for attr in ('centroids', 'labels', 'inertia', 'iteration_history', 'n_iter',
+                     'distance_evaluations_skipped'):
+            setattr(self, attr, getattr(best, attr))
+        print(f"K-Means best of {self.n_init} restarts: inertia {self.inertia:.4f}")
 
     def fit(self, X):
-        # Initialize centroids using K-Means++
-        self.centroids = self._kmeans_plusplus_init(X)
+        if self.exact_1d and X.shape[1] == 1:
+            self._fit_1d(X)
+            return
+        if self.n_init > 1:
+            self._fit_restarts(X)
+            return
+
+        # Initialize centroids using K-Means++ (or the configured variant)
+        self.centroids = self._init_centroids(X)
         
         # Store initial centroids
-        self.iteration_history.append({
-            'iteration': 0,
-            'centroids': self.centroids.copy(),
-            'distances': None,
-            'labels': None
-        })
+        self.iteration_history.record(iteration=0, centroids=self.centroids.copy())
 
+        n_samples = X.shape[0]
+        self.distance_evaluations_skipped = 0
         for iteration in range(self.max_iterations):
             # Assign clusters
-            distances = np.sqrt(((X - self.centroids[:, np.newaxis])**2).sum(axis=2))
-            self.labels = np.argmin(distances, axis=0)
+            if self.algorithm == 'lloyd' or iteration == 0:
+                distances = np.sqrt(((X - self.centroids[:, np.newaxis])**2).sum(axis=2))
+                self.labels = np.argmin(distances, axis=0)
+                skipped = 0
+                if self.algorithm != 'lloyd':
+                    self._init_bounds(distances)
+            else:
+                distances = None
+                skipped = n_samples * self.k - self._assign_with_bounds(X)
+            self.distance_evaluations_skipped += skipped
 
-            # Store iteration data
-            self.iteration_history.append({
-                'iteration': iteration + 1,
-                'centroids': self.centroids.copy(),
-                'distances': distances.copy(),
-                'labels': self.labels.copy()
-            })
+            # Store iteration data (centroids and labels only: the k x n distances
+            # are recomputed on demand, see get_kmeans_iteration_details)
+            self.iteration_history.record(iteration=iteration + 1, centroids=self.centroids.copy(),
+                                          labels=self.labels,
+                                          skipped_distance_evaluations=int(skipped))
 
             # Update centroids
             new_centroids = np.array([
@@ -92,6 +225,8 @@ class KMeansManual:
                 print(f"K-Means converged at iteration {iteration + 1}")
                 break
 
+            if self.algorithm != 'lloyd':
+                self._update_bounds(np.sqrt(((new_centroids - self.centroids)**2).sum(axis=1)))
             self.centroids = new_centroids
         else:
             self.n_iter = self.max_iterations
@@ -100,6 +235,243 @@ class KMeansManual:
         # Calculate final inertia
         distances = np.sqrt(((X - self.centroids[self.labels])**2).sum(axis=1))
         self.inertia = np.sum(distances**2)
+        self._upper = self._lower = None
+
+    def _init_bounds(self, distances):
+        """Start the triangle-inequality bounds from a full (k, n) distance table"""
+        point_idx = np.arange(distances.shape[1])
+        self._upper = distances[self.labels, point_idx].copy()
+        if self.algorithm == 'elkan':
+            # One lower bound per (point, centroid)
+            self._lower = distances.T.copy()
+        else:
+            # Hamerly: one lower bound on the second-nearest centroid
+            self._lower = np.partition(distances, 1, axis=0)[1].copy() if self.k > 1 else np.full(len(point_idx), np.inf)
+
+    def _update_bounds(self, shift):
+        """Loosen the bounds by how far each centroid moved"""
+        self._upper += shift[self.labels]
+        if self.algorithm == 'elkan':
+            self._lower = np.maximum(self._lower - shift[np.newaxis, :], 0.0)
+            return
+        if self.k == 1:
+            return
+        # A point's other centroids moved at most the largest shift except its own
+        order = np.argsort(shift)
+        largest, second = shift[order[-1]], shift[order[-2]]
+        other_shift = np.where(self.labels == order[-1], second, largest)
+        self._lower = np.maximum(self._lower - other_shift, 0.0)
+
+    def _assign_with_bounds(self, X):
+        """Elkan / Hamerly assignment step; returns the number of distances computed
+
+        A point keeps its centroid when its upper bound is below half the gap
+        to the nearest other centroid or below its lower bound(s), so only
+        points (and, for Elkan, centroids) that might change are recomputed.
+        Distances are evaluated with the same expression as Lloyd, so the
+        resulting labels match the Lloyd path.
+        """
+        center_dist = np.sqrt(((self.centroids[:, np.newaxis] - self.centroids[np.newaxis])**2).sum(axis=2))
+        np.fill_diagonal(center_dist, np.inf)
+        half_gap = 0.5 * center_dist.min(axis=1)
+        # Guard the pruning tests against rounding in the accumulated bounds
+        slack = 1 + 1e-10
+        computed = 0
+
+        if self.algorithm == 'hamerly':
+            bound = np.maximum(half_gap[self.labels], self._lower)
+            active = np.flatnonzero(self._upper * slack > bound)
+            # Tighten the upper bound before paying for all k distances
+            self._upper[active] = np.sqrt(((X[active] - self.centroids[self.labels[active]])**2).sum(axis=1))
+            computed += len(active)
+            active = active[self._upper[active] * slack > bound[active]]
+            if len(active):
+                distances = np.sqrt(((X[active] - self.centroids[:, np.newaxis])**2).sum(axis=2))
+                cols = np.arange(len(active))
+                # The own-centroid distance is the one just tightened: only k - 1 are new,
+                # so a point never costs more than k evaluations
+                distances[self.labels[active], cols] = self._upper[active]
+                computed += len(active) * (self.k - 1)
+                order = np.argsort(distances, axis=0, kind='stable')
+                self.labels[active] = order[0]
+                self._upper[active] = distances[order[0], cols]
+                self._lower[active] = distances[order[1], cols] if self.k > 1 else np.inf
+            return computed
+
+        # Elkan
+        active = np.flatnonzero(self._upper * slack > half_gap[self.labels])
+        labels = self.labels[active]
+        upper = np.sqrt(((X[active] - self.centroids[labels])**2).sum(axis=1))
+        computed += len(active)
+        self._upper[active] = upper
+        self._lower[active, labels] = upper
+        # Centroids that could still be closer than the current one
+        candidates = ((upper[:, np.newaxis] * slack > self._lower[active])
+                      & (upper[:, np.newaxis] * slack > 0.5 * center_dist[labels]))
+        rows, cols = np.nonzero(candidates)
+        if len(rows):
+            points = active[rows]
+            pair_dist = np.sqrt(((X[points] - self.centroids[cols])**2).sum(axis=1))
+            computed += len(rows)
+            self._lower[points, cols] = pair_dist
+            # Best distance per active point among its own centroid and the candidates
+            table = np.full((len(active), self.k), np.inf)
+            table[np.arange(len(active)), labels] = upper
+            table[rows, cols] = pair_dist
+            new_labels = np.argmin(table, axis=1)
+            self.labels[active] = new_labels
+            self._upper[active] = table[np.arange(len(active)), new_labels]
+        return computed
+
+    def predict(self, X):
+        distances = np.sqrt(((X - self.centroids[:, np.newaxis])**2).sum(axis=2))
+        return np.argmin(distances, axis=0)
+
+
+class MiniBatchKMeansManual:
+    """Mini-batch K-Means (Sculley 2010) with incremental ``partial_fit``
+
+    Each step assigns one batch and moves every centroid towards the mean of
+    its batch points with a per-centroid learning rate of
+    batch_count / (points seen so far), so earlier data keeps its weight
+    without being revisited. Centroids whose accumulated count has stayed
+    below ``reassignment_ratio`` of the largest count for
+    ``reassignment_patience`` consecutive steps (empty or stale clusters) are
+    moved to batch points sampled by squared distance. ``fit`` stops when an
+    exponentially weighted average (EWA) of the batch inertia has not improved
+    for ``max_no_improvement`` steps.
+
+    Library-only: the routes cluster a few hundred aggregated rows, where
+    full-batch KMeansManual is already fast.
+    """
+
+    def __init__(self, k=3, batch_size=1024, max_iterations=100, random_state=42, tol=0.0,
+                 max_no_improvement=10, reassignment_ratio=0.01, reassignment_patience=10, ewa_alpha=None):
+        self.k = k
+        self.batch_size = batch_size
+        self.max_iterations = max_iterations  # Maximum number of mini-batch steps in fit
+        self.random_state = random_state
+        self.tol = tol  # Stop when no centroid moves more than this (0 disables)
+        self.max_no_improvement = max_no_improvement  # Steps without EWA inertia improvement
+        self.reassignment_ratio = reassignment_ratio  # Relative count below which a centroid is stale
+        self.reassignment_patience = reassignment_patience  # Consecutive low steps before reassignment
+        self.ewa_alpha = ewa_alpha  # EWA smoothing, default 2 * batch / (n + 1) in fit, 0.1 in partial_fit
+        self.centroids = None
+        self.counts = None  # Points absorbed by each centroid so far
+        self.labels = None
+        self.inertia = None
+        self.n_iter = 0
+        self.n_steps = 0  # Total mini-batch steps, including partial_fit calls
+        self.ewa_inertia = None
+        self.ewa_inertia_min = None
+        self._no_improvement = 0
+        self._low_steps = None  # Consecutive steps each centroid's count has been below the threshold
+        self._rng = None  # np.random.Generator owned by this instance
+
+    def _init_centroids(self, X):
+        seeding = KMeansManual(k=self.k, random_state=self.random_state)
+        self.centroids = seeding._init_centroids(X)
+        self.counts = np.zeros(self.k)
+        self._low_steps = np.zeros(self.k, dtype=int)
+
+    def _minibatch_step(self, X_batch, ewa_alpha):
+        """Update centroids from one batch; returns the maximum centroid shift"""
+        distances_sq = ((X_batch[:, np.newaxis, :] - self.centroids[np.newaxis])**2).sum(axis=2)
+        labels = np.argmin(distances_sq, axis=1)
+        min_dist_sq = distances_sq[np.arange(len(X_batch)), labels]
+        batch_inertia = min_dist_sq.sum() / len(X_batch)
+
+        batch_counts = np.bincount(labels, minlength=self.k)
+        batch_sums = np.zeros_like(self.centroids)
+        np.add.at(batch_sums, labels, X_batch)
+
+        # Per-centroid learning rate: eta = batch_count / (old_count + batch_count)
+        old_centroids = self.centroids.copy()
+        has_points = batch_counts > 0
+        new_counts = self.counts + batch_counts
+        self.centroids[has_points] = (
+            old_centroids[has_points] * self.counts[has_points, np.newaxis] + batch_sums[has_points]
+        ) / new_counts[has_points, np.newaxis]
+        self.counts = new_counts
+
+        self._reassign_stale(X_batch, min_dist_sq)
+        self.n_steps += 1
+
+        # Track the EWA of the batch inertia for the convergence test
+        if self.ewa_inertia is None:
+            self.ewa_inertia = batch_inertia
+        else:
+            self.ewa_inertia = self.ewa_inertia * (1 - ewa_alpha) + batch_inertia * ewa_alpha
+        if self.ewa_inertia_min is None or self.ewa_inertia < self.ewa_inertia_min:
+            self.ewa_inertia_min = self.ewa_inertia
+            self._no_improvement = 0
+        else:
+            self._no_improvement += 1
+
+        return np.max(np.abs(self.centroids - old_centroids))
+
+    def _reassign_stale(self, X_batch, min_dist_sq):
+        """Move centroids that stayed empty / rarely used onto batch points far from their centroid"""
+        if self.reassignment_ratio <= 0 or self.counts.max() == 0:
+            return
+        low = self.counts < self.reassignment_ratio * self.counts.max()
+        self._low_steps = np.where(low, self._low_steps + 1, 0)
+        stale = np.flatnonzero(self._low_steps >= self.reassignment_patience)
+        total = min_dist_sq.sum()
+        probabilities = min_dist_sq / total if total > 0 else None
+        # Sampling without replacement needs a distinct candidate point per centroid
+        # (duplicate-heavy batches have few points away from their centroid)
+        stale = stale[:len(X_batch) if probabilities is None else np.count_nonzero(probabilities)]
+        if len(stale) == 0:
+            return
+        new_points = self._rng.choice(len(X_batch), size=len(stale), replace=False, p=probabilities)
+        self.centroids[stale] = X_batch[new_points]
+        # Restart them with a small count so they can still move quickly
+        self.counts[stale] = self.counts[self.counts > 0].min() if np.any(self.counts > 0) else 0
+        self._low_steps[stale] = 0
+
+    def partial_fit(self, X_batch):
+        """Update the model with one batch of new points (e.g. after an upload)"""
+        X_batch = np.asarray(X_batch, dtype=float)
+        if self.centroids is None:
+            self._rng = np.random.default_rng(self.random_state)
+            self._init_centroids(X_batch)
+        self._minibatch_step(X_batch, self.ewa_alpha or 0.1)
+        self.labels = self.predict(X_batch)
+        return self
+
+    def fit(self, X):
+        X = np.asarray(X, dtype=float)
+        self._rng = np.random.default_rng(self.random_state)
+        n_samples = X.shape[0]
+        batch_size = min(self.batch_size, n_samples)
+        ewa_alpha = self.ewa_alpha or min(1.0, 2.0 * batch_size / (n_samples + 1))
+
+        # Fresh early-stopping state (partial_fit keeps it across calls, fit starts over)
+        self.n_steps = 0
+        self.ewa_inertia = None
+        self.ewa_inertia_min = None
+        self._no_improvement = 0
+        self._init_centroids(X)
+        for step in range(self.max_iterations):
+            batch = X[self._rng.integers(0, n_samples, size=batch_size)]
+            shift = self._minibatch_step(batch, ewa_alpha)
+
+            if self.tol > 0 and shift < self.tol:
+                self.n_iter = step + 1
+                print(f"Mini-batch K-Means converged at step {step + 1} (centroid shift)")
+                break
+            if self._no_improvement >= self.max_no_improvement:
+                self.n_iter = step + 1
+                print(f"Mini-batch K-Means converged at step {step + 1} (no EWA inertia improvement)")
+                break
+        else:
+            self.n_iter = self.max_iterations
+            print(f"Mini-batch K-Means reached max steps: {self.max_iterations}")
+
+        self.labels = self.predict(X)
+        self.inertia = np.sum((X - self.centroids[self.labels])**2)
+        return self
 
     def predict(self, X):
         distances = np.sqrt(((X - self.centroids[:, np.newaxis])**2).sum(axis=2))
@@ -108,31 +480,7 @@ class KMeansManual:
 
 def davies_bouldin_index_manual(X, labels, centroids):
     """Calculate Davies-Bouldin Index"""
-    n_clusters = len(np.unique(labels))
-    
-    if n_clusters <= 1:
-        return 0.0
-
-    # Calculate avg distance from points to centroid
-    S = np.zeros(n_clusters)
-    for i in range(n_clusters):
-        cluster_points = X[labels == i]
-        if len(cluster_points) > 0:
-            S[i] = np.mean(np.linalg.norm(cluster_points - centroids[i], axis=1))
-
-    # Calculate Davies-Bouldin Index
-    db_index = 0.0
-    for i in range(n_clusters):
-        max_ratio = 0.0
-        for j in range(n_clusters):
-            if i != j:
-                centroid_distance = np.linalg.norm(centroids[i] - centroids[j])
-                if centroid_distance > 0:
-                    ratio = (S[i] + S[j]) / centroid_distance
-                    max_ratio = max(max_ratio, ratio)
-        db_index += max_ratio
-
-    return db_index / n_clusters
+    return davies_bouldin_index(X, labels, centroids)
 
 
 def assign_tiers_by_percentile(df_aggregated, cluster_labels):
@@ -197,60 +545,6 @@ def assign_tiers_by_percentile(df_aggregated, cluster_labels):
     return np.array(tier_labels), df
 
 
-def get_size_range(harga):
-    """Categorize price into size category"""
-    try:
-        harga = float(harga)
-        if harga < 50000:
-            return 'Small'
-        elif harga < 100000:
-            return 'Medium'
-        else:
-            return 'Large'
-    except:
-        return 'Unknown'
-
-
-def get_size_range(size_str):
-    """Extract size in cm and group by 5cm ranges"""
-    try:
-        # Extract number from "XX cm" format
-        size_num = int(size_str.replace('cm', '').strip())
-        # Group by 5cm: 0-4, 5-9, 10-14, 15-19, 20-24, etc
-        range_start = (size_num // 5) * 5
-        range_end = range_start + 4
-        return f"{range_start}-{range_end} cm"
-    except:
-        return "Unknown"
-
-
-def aggregate_data_by_size_range(df):
-    """Aggregate data by 5cm size ranges and category before clustering"""
-    # Group by category and size range, sum the values
-    df['size_range'] = df['size'].apply(get_size_range)
-    
-    # Remove rows with Unknown size range
-    df = df[df['size_range'] != 'Unknown'].copy()
-    
-    # Aggregate by kategori and size_range
-    aggregated = df.groupby(['kategori', 'size_range']).agg({
-        'jumlah_terjual': 'sum',  # Total units sold
-        'total_harga': 'sum',
-        'id': 'count'  # Count number of transactions
-    }).reset_index()
-    
-    # Rename 'id' column to 'jumlah_transaksi'
-    aggregated.rename(columns={'id': 'jumlah_transaksi'}, inplace=True)
-    
-    # Keep track of original indices for later reference
-    aggregated['original_rows'] = aggregated.apply(
-        lambda row: df[(df['kategori'] == row['kategori']) & (df['size_range'] == row['size_range'])].index.tolist(),
-        axis=1
-    )
-    
-    return aggregated
-
-
 def analyze_clustering_results(data, labels, medoid_indices):
     """Analyze clustering results - Standard and Non-Standard breakdown by 5cm size ranges"""
     analysis = {
@@ -383,41 +677,21 @@ def analyze_clustering_results_aggregated(df_aggregated, labels, centroids):
     return analysis
 
 
-def process_kmeans_manual(k=3):
+def process_kmeans_manual(k=3, n_init=1):
     """Process data using KMeans clustering with 5cm size range aggregation"""
     try:
-        # Get data from database
-        data = Penjualan.query.all()
-        if not data:
+        # Aggregated, normalized features (cached until the penjualan data changes)
+        features = get_features()
+        if features is None:
             return None
-
-        # Convert to DataFrame
-        df = pd.DataFrame([{
-            'id': d.id,
-            'kategori': d.kategori,
-            'size': d.size,
-            'jumlah_terjual': d.jumlah_terjual,
-            'harga_satuan': float(d.harga_satuan) if d.harga_satuan else 0,
-            'total_harga': float(d.total_harga) if d.total_harga else 0,
-            'nama_penjual': d.nama_penjual,
-            'kota_tujuan': d.kota_tujuan
-        } for d in data])
-
-        # Aggregate data by 5cm size ranges first
-        df_aggregated = aggregate_data_by_size_range(df)
-        
-        # Prepare features for clustering (use aggregated data)
-        # ✨ CLUSTERING DENGAN 2 FITUR: jumlah_terjual dan jumlah_transaksi
-        X = df_aggregated[['jumlah_terjual', 'jumlah_transaksi']].values.astype(float)
-
-        # Normalize data
-        X_mean = X.mean(axis=0)
-        X_std = X.std(axis=0)
-        X_normalized = (X - X_mean) / (X_std + 1e-8)
-
-        # Perform KMeans with optimized parameters
-        kmeans = KMeansManual(k=k, max_iterations=10, random_state=42)
-        kmeans.fit(X_normalized)
+        df_aggregated = features['data_aggregated']
+        X_mean, X_std = features['X_mean'], features['X_std']
+        X_normalized = features['X_normalized']
+
+        # Perform KMeans with optimized parameters (memoized for repeat requests)
+        kmeans = cached_fit(features, KMeansManual,
+                            {'k': k, 'max_iterations': 10, 'random_state': 42, 'n_init': n_init,
+                             'history': 'none'})
         cluster_labels = kmeans.labels
 
         # ✨ NEW: Assign tiers based on PERCENTILE (not cluster ID)
@@ -449,7 +723,8 @@ def process_kmeans_manual(k=3):
             'max_iterations': kmeans.max_iterations,  # Maximum iterations configured
             'n_samples': len(df_aggregated),
             'centroids': kmeans.centroids,
-            'data': df,
+            'runs_summary': kmeans.runs_summary,
+            'data_counts': features['data_counts'],
             'data_aggregated': df_aggregated,
             'analysis': analysis,
             'X_mean': X_mean,
@@ -480,8 +755,8 @@ def save_kmeans_manual_result(result):
         kmeans_result = result['kmeans']
         tier_labels = result['labels']  # Tier labels for final output
         cluster_labels = result['cluster_labels']  # Original cluster labels for indexing
-        data = result['data']
-        data_aggregated = result.get('data_aggregated', data)  # Use aggregated data if available
+        data_counts = result['data_counts']
+        data_aggregated = result['data_aggregated']
         analysis = result['analysis']
 
         # Count tier distribution
@@ -502,10 +777,10 @@ def save_kmeans_manual_result(result):
             random_state=42,
             cluster_distribution=cluster_dist,
             analysis_data=analysis,
-            data_kategori_count=data['kategori'].nunique(),
-            data_size_count=data['size'].nunique(),
-            data_penjual_count=data['nama_penjual'].nunique(),
-            data_kota_count=data['kota_tujuan'].nunique()
+            data_kategori_count=data_counts['kategori'],
+            data_size_count=data_counts['size'],
+            data_penjual_count=data_counts['nama_penjual'],
+            data_kota_count=data_counts['kota_tujuan']
         )
         db.session.add(result_record)
         db.session.flush()
@@ -651,8 +926,10 @@ def get_kmeans_iteration_details(data_df, X_normalized, kmeans_model):
     for iter_data in kmeans_model.iteration_history:
         iteration_num = iter_data['iteration']
         centroids = iter_data['centroids']
-        distances = iter_data['distances']
         labels = iter_data['labels']
+        # Recompute the (k, n) distances from the stored centroids
+        distances = (np.sqrt(((X_normalized - centroids[:, np.newaxis])**2).sum(axis=2))
+                     if labels is not None else None)
         
         # Build iteration detail
         iter_detail = {
@@ -1,6 +1,13 @@
+import hashlib
 import pandas as pd
 import numpy as np
-from app.models import db, Penjualan, KMedoidsResult, KMedoidsClusterDetail
+from app.models import db, KMedoidsResult, KMedoidsClusterDetail
+from app.cache import get_features, cached_fit
+from app.clustering_1d import kmedoids_1d
+from app.parallel import run_restarts
+from app.cluster_metrics import davies_bouldin_index
+from app.history import IterationHistory
+from app.preprocessing import aggregate_data_by_size_range, get_size_range
 
 
 def convert_numpy_types(obj):
@@ -18,32 +25,178 @@ def convert_numpy_types(obj):
     return obj
 
 
+def pairwise_distances(X, Y, metric='manhattan', out=None):
+    """Distances between every row of X and every row of Y, shape (len(X), len(Y))"""
+    if metric not in ('manhattan', 'euclidean'):
+        raise ValueError(f"Unsupported metric: {metric}")
+    n_features = X.shape[1]
+    if n_features >= 8:
+        # Wide data: one broadcast, summed the same way np.sum sums a row
+        diff = X[:, np.newaxis, :] - Y[np.newaxis, :, :]
+        if metric == 'manhattan':
+            np.abs(diff, out=diff)
+            return diff.sum(axis=2, out=out)
+        np.square(diff, out=diff)
+        return np.sqrt(diff.sum(axis=2, out=out), out=out)
+
+    # Narrow data: accumulate feature by feature into a 2-D buffer,
+    # avoiding the (len(X), len(Y), d) temporary entirely
+    if out is None:
+        out = np.empty((X.shape[0], Y.shape[0]), dtype=np.result_type(X, Y))
+    tmp = np.empty_like(out) if n_features > 1 else None
+    for f in range(n_features):
+        target = out if f == 0 else tmp
+        np.subtract(X[:, f, np.newaxis], Y[np.newaxis, :, f], out=target)
+        if metric == 'manhattan':
+            np.abs(target, out=target)
+        else:
+            np.square(target, out=target)
+        if f > 0:
+            out += tmp
+    if metric == 'euclidean':
+        np.sqrt(out, out=out)
+    return out
+
+
+def rows_per_block(n_rows, n_features, itemsize, memory_budget_mb):
+    """Number of rows per block whose distance temporaries fit the memory budget"""
+    temp_width = n_features + 1 if n_features >= 8 else 2
+    bytes_per_row = max(1, n_rows) * temp_width * itemsize
+    return max(1, int(memory_budget_mb * 1024 * 1024 // bytes_per_row))
+
+
+def compute_distance_matrix(X, metric='manhattan', dtype=np.float64, memory_budget_mb=256, out=None):
+    """Compute the full n x n distance matrix block by block
+
+    Each block of rows is broadcast against all points at once, so the
+    temporary difference array never exceeds ``memory_budget_mb``. ``out``
+    may be a preallocated (e.g. memory-mapped) n x n array to fill.
+    """
+    X = np.asarray(X, dtype=dtype)
+    n_samples, n_features = X.shape
+    dist_matrix = np.empty((n_samples, n_samples), dtype=dtype) if out is None else out
+    block = rows_per_block(n_samples, n_features, X.itemsize, memory_budget_mb)
+    for start in range(0, n_samples, block):
+        stop = min(start + block, n_samples)
+        pairwise_distances(X[start:stop], X, metric, out=dist_matrix[start:stop])
+    return dist_matrix
+
+
+def distance_matrix_key(X, metric='manhattan', dtype=np.float64):
+    """Hash identifying the distance matrix of X under a metric and dtype"""
+    X = np.ascontiguousarray(X)
+    digest = hashlib.sha1(X.tobytes())
+    digest.update(f"{X.shape}|{X.dtype.str}|{metric}|{np.dtype(dtype).str}".encode())
+    return digest.hexdigest()
+
+
+class DistanceMatrix:
+    """Pairwise distance matrix of X, reusable by every fit on the same data
+
+    The matrix depends only on X and the metric, not on k, so a k-sweep can
+    build it once. ``key`` (see distance_matrix_key) lets a fit check the
+    matrix really belongs to its data. With ``path`` the matrix is written
+    to a .npy file and memory-mapped; pickling then only sends the path, so
+    worker processes share the file instead of copying n x n floats.
+    """
+
+    def __init__(self, X, metric='manhattan', dtype=np.float64, memory_budget_mb=256, path=None):
+        self.key = distance_matrix_key(X, metric, dtype)
+        self.metric = metric
+        self.path = path
+        n_samples = X.shape[0]
+        if path is None:
+            self.matrix = compute_distance_matrix(X, metric, dtype, memory_budget_mb)
+        else:
+            matrix = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(n_samples, n_samples))
+            compute_distance_matrix(X, metric, dtype, memory_budget_mb, out=matrix)
+            matrix.flush()
+            del matrix
+            self.matrix = np.load(path, mmap_mode='r')
+
+    def matches(self, X, metric, dtype=np.float64):
+        return self.key == distance_matrix_key(X, metric, dtype)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.path is not None:
+            state['matrix'] = None  # Reopened from disk by the receiving process
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.path is not None:
+            self.matrix = np.load(self.path, mmap_mode='r')
+
+
+def _nearest_second(distances):
+    """Nearest column, its distance and the second-nearest distance per row of (n, k)"""
+    point_idx = np.arange(distances.shape[0])
+    if distances.shape[1] == 1:
+        return (np.zeros(distances.shape[0], dtype=np.int64), distances[:, 0].copy(),
+                np.full(distances.shape[0], np.inf))
+    order = np.argsort(distances, axis=1, kind='stable')
+    nearest = order[:, 0]
+    return nearest, distances[point_idx, nearest], distances[point_idx, order[:, 1]]
+
+
 class KMedoidsManual:
-    def __init__(self, k=3, max_iterations=10, random_state=42):
+    def __init__(self, k=3, max_iterations=10, random_state=42, metric='manhattan',
+                 dtype=np.float64, memory_budget_mb=256, swap='random', method='pam',
+                 sample_size=None, n_sampling=5, numlocal=2, maxneighbor=None, exact_1d=True,
+                 n_init=1, n_jobs=None, history='full', init='build'):
+        if metric not in ('manhattan', 'euclidean'):
+            raise ValueError(f"Unsupported metric: {metric}")
+        if swap not in ('random', 'pam', 'fasterpam'):
+            raise ValueError(f"Unsupported swap strategy: {swap}")
+        if method not in ('pam', 'clara', 'clarans'):
+            raise ValueError(f"Unsupported method: {method}")
+        if init not in ('build', 'k-medoids++'):
+            raise ValueError(f"Unsupported init: {init}")
         self.k = k
         self.max_iterations = max_iterations
         self.random_state = random_state
+        self.metric = metric  # 'manhattan' or 'euclidean'
+        self.dtype = dtype  # np.float32 halves distance matrix memory
+        self.memory_budget_mb = memory_budget_mb  # Max temporary memory per distance block
+        # 'random': try a few sampled swaps per iteration (original heuristic)
+        # 'pam': apply the single best swap per pass (exact PAM SWAP)
+        # 'fasterpam': apply every improving swap eagerly within a pass (FasterPAM)
+        self.swap = swap
+        # 'pam': cluster on the full n x n distance matrix
+        # 'clara': run PAM on random subsamples, score medoids on all points
+        # 'clarans': randomized neighbour search, distances computed on demand
+        self.method = method
+        self.sample_size = sample_size  # CLARA subsample size, default 40 + 2k
+        self.n_sampling = n_sampling  # Number of CLARA subsamples
+        self.numlocal = numlocal  # Number of CLARANS local searches (restarts)
+        self.maxneighbor = maxneighbor  # CLARANS failed neighbours before stopping
+        self.exact_1d = exact_1d  # Use the exact DP solver for single-feature data
+        self.n_init = n_init  # Independent restarts; the lowest cost wins
+        self.n_jobs = n_jobs  # Worker processes for restarts (None = all CPUs, 1 = serial)
+        # 'build': deterministic (most central point, then farthest-first)
+        # 'k-medoids++': seeds drawn from this fit's generator; used by every restart,
+        # since identical deterministic seeds would make n_init > 1 pointless
+        self.init = init
+        self.runs_summary = []  # One entry per restart when n_init > 1
+        self._rng = None  # np.random.Generator owned by this instance, created per fit
         self.medoids = None
         self.labels = None
         self.cost = None
-        self.iteration_history = []  # Track iteration history
+        # 'none', 'summary', 'centers' or 'full' (labels stored as per-iteration deltas)
+        self.history = history
+        self.iteration_history = IterationHistory(history)  # Track iteration history
         self.distance_matrix = None  # Cache distance matrix
         self.n_iter = 0  # Track actual iterations used
 
     def _compute_distance_matrix(self, X):
         """Compute and cache the distance matrix once"""
-        n_samples = X.shape[0]
-        dist_matrix = np.zeros((n_samples, n_samples))
-        for i in range(n_samples):
-            for j in range(i, n_samples):
-                dist = np.sum(np.abs(X[i] - X[j]))
-                dist_matrix[i, j] = dist
-                dist_matrix[j, i] = dist
-        return dist_matrix
+        return compute_distance_matrix(X, self.metric, self.dtype, self.memory_budget_mb)
 
     def _medoid_initialization(self, X, distance_matrix):
         """Initialize medoids using total minimum distance approach (similar to K-Medoids++)"""
-        np.random.seed(self.random_state)
+        if self.init == 'k-medoids++':
+            return self._kmedoids_plusplus_init(distance_matrix)
         n_samples = X.shape[0]
         medoids = []
         
@@ -62,15 +215,71 @@ class KMedoidsManual:
         
         return np.array(medoids)
 
-    def fit(self, X):
-        np.random.seed(self.random_state)
+    def _kmedoids_plusplus_init(self, distance_matrix):
+        """K-Medoids++ seeding: each next medoid is drawn with probability
+        proportional to its squared distance to the nearest chosen medoid"""
+        n_samples = distance_matrix.shape[0]
+        medoids = [int(self._rng.integers(n_samples))]
+        min_dist_sq = np.asarray(distance_matrix[medoids[0]], dtype=float) ** 2
+        for _ in range(self.k - 1):
+            total = min_dist_sq.sum()
+            # All points already coincide with a medoid: fall back to uniform sampling
+            probabilities = min_dist_sq / total if total > 0 else np.full(n_samples, 1.0 / n_samples)
+            medoids.append(int(self._rng.choice(n_samples, p=probabilities)))
+            min_dist_sq = np.minimum(min_dist_sq, np.asarray(distance_matrix[medoids[-1]], dtype=float) ** 2)
+        return np.array(medoids)
+
+    def _restart_params(self):
+        """Constructor arguments shared by every restart"""
+        return {
+            'k': self.k, 'max_iterations': self.max_iterations, 'metric': self.metric,
+            'dtype': self.dtype, 'memory_budget_mb': self.memory_budget_mb, 'swap': self.swap,
+            'method': self.method, 'sample_size': self.sample_size, 'n_sampling': self.n_sampling,
+            'numlocal': self.numlocal, 'maxneighbor': self.maxneighbor, 'exact_1d': self.exact_1d,
+            'history': self.history, 'init': 'k-medoids++'
+        }
+
+    def _fit_restarts(self, X, distance_matrix=None):
+        """Run n_init seeded restarts in a process pool and keep the best"""
+        best, self.runs_summary = run_restarts(KMedoidsManual, self._restart_params(), X, self.n_init,
+                                               self.random_state, 'cost', self.n_jobs,
+                                               fit_kwargs={'distance_matrix': distance_matrix})
+        for attr in ('medoids', 'labels', 'cost', 'iteration_history', 'n_iter'):
+            setattr(self, attr, getattr(best, attr))
+        print(f"K-Medoids best of {self.n_init} restarts: cost {self.cost:.4f}")
+
+    def fit(self, X, distance_matrix=None):
+        """Fit on X; ``distance_matrix`` may be a prebuilt DistanceMatrix of X"""
+        # Instance-owned generator: concurrent fits never touch global random state
+        self._rng = np.random.default_rng(self.random_state)
         n_samples = X.shape[0]
 
-        # Compute distance matrix once and cache it
-        self.distance_matrix = self._compute_distance_matrix(X)
+        if self.exact_1d and X.shape[1] == 1:
+            self._fit_1d(X)
+            return
+        if self.n_init > 1:
+            self._fit_restarts(X, distance_matrix)
+            return
+        if self.method == 'clara':
+            self._fit_clara(X)
+            return
+        if self.method == 'clarans':
+            self._fit_clarans(X)
+            return
+
+        # Compute distance matrix once and cache it (or reuse the shared one)
+        if distance_matrix is not None:
+            if not distance_matrix.matches(X, self.metric, self.dtype):
+                raise ValueError("distance_matrix was built from different data, metric or dtype")
+            self.distance_matrix = distance_matrix.matrix
+        else:
+            self.distance_matrix = self._compute_distance_matrix(X)
 
         # Initialize medoids using smart initialization
         self.medoids = self._medoid_initialization(X, self.distance_matrix)
+        if self.swap != 'random':
+            self._fit_swap(X)
+            return
         old_medoids = None
 
         for iteration in range(self.max_iterations):
@@ -82,14 +291,10 @@ class KMedoidsManual:
             current_cost = np.sum(np.min(distances, axis=1))
 
             # Store iteration history
-            iteration_data = {
-                'iteration': int(iteration),
-                'medoids': [int(m) for m in self.medoids],
-                'medoid_points': X[self.medoids].copy().tolist(),
-                'labels': self.labels.copy().tolist(),
-                'cost': float(current_cost)
-            }
-            self.iteration_history.append(iteration_data)
+            self.iteration_history.record(iteration=int(iteration),
+                                          medoids=[int(m) for m in self.medoids],
+                                          medoid_points=X[self.medoids].copy(),
+                                          labels=self.labels, cost=float(current_cost))
 
             # Check convergence: if medoids haven't changed
             if old_medoids is not None and np.array_equal(self.medoids, old_medoids):
@@ -111,7 +316,7 @@ class KMedoidsManual:
             # Limit swap attempts for efficiency
             max_swap_attempts = min(len(non_medoids), min(10, n_samples // 5))
             if max_swap_attempts > 0:
-                swap_candidates = np.random.choice(non_medoids, size=max_swap_attempts, replace=False)
+                swap_candidates = self._rng.choice(non_medoids, size=max_swap_attempts, replace=False)
 
                 for new_medoid in swap_candidates:
                     for i, old_medoid in enumerate(self.medoids):
@@ -144,51 +349,233 @@ class KMedoidsManual:
         self.cost = np.sum(np.min(distances, axis=1))
         print(f"K-Medoids reached max iterations: {self.max_iterations}")
 
+    def _nearest_caches(self):
+        """Nearest / second-nearest medoid slot and distance for every point"""
+        return _nearest_second(self.distance_matrix[self.medoids].T)
+
+    def _swap_deltas(self, candidate, nearest, d_nearest, d_second, removal_loss):
+        """Change in total cost for swapping ``candidate`` with each medoid slot
+
+        Uses the nearest / second-nearest caches, so one candidate costs O(n)
+        regardless of k (FasterPAM, Schubert & Rousseeuw 2021).
+        """
+        d_candidate = self.distance_matrix[candidate]
+        if len(self.medoids) == 1:
+            return np.array([np.sum(d_candidate - d_nearest)])
+
+        closer = d_candidate < d_nearest
+        # Points that move to the candidate whichever medoid is removed
+        delta_add = np.sum(d_candidate[closer] - d_nearest[closer])
+        deltas = removal_loss + delta_add
+        deltas += np.bincount(nearest[closer], weights=d_nearest[closer] - d_second[closer],
+                              minlength=self.k)
+        # Points that would fall back to the candidate instead of their second medoid
+        between = ~closer & (d_candidate < d_second)
+        deltas += np.bincount(nearest[between], weights=d_candidate[between] - d_second[between],
+                              minlength=self.k)
+        return deltas
+
+    def _fit_swap(self, X):
+        """Exact SWAP phase ('pam' or 'fasterpam') on the cached distance matrix"""
+        n_samples = X.shape[0]
+        nearest, d_nearest, d_second = self._nearest_caches()
+
+        for iteration in range(self.max_iterations):
+            current_cost = float(np.sum(d_nearest))
+            self.labels = nearest
+            self.iteration_history.record(iteration=int(iteration),
+                                          medoids=[int(m) for m in self.medoids],
+                                          medoid_points=X[self.medoids].copy(),
+                                          labels=nearest, cost=current_cost)
+
+            # Ignore improvements that are only floating point noise
+            threshold = -1e-12 * max(current_cost, 1.0)
+            is_medoid = np.zeros(n_samples, dtype=bool)
+            is_medoid[self.medoids] = True
+            removal_loss = np.bincount(nearest, weights=d_second - d_nearest, minlength=self.k)
+            best_delta, best_swap = threshold, None
+            n_swaps = 0
+
+            for candidate in range(n_samples):
+                if is_medoid[candidate]:
+                    continue
+                deltas = self._swap_deltas(candidate, nearest, d_nearest, d_second, removal_loss)
+                slot = int(np.argmin(deltas))
+                if deltas[slot] >= best_delta:
+                    continue
+                if self.swap == 'pam':
+                    best_delta, best_swap = deltas[slot], (slot, candidate)
+                    continue
+
+                # FasterPAM: apply the improving swap immediately
+                is_medoid[self.medoids[slot]] = False
+                is_medoid[candidate] = True
+                self.medoids[slot] = candidate
+                nearest, d_nearest, d_second = self._nearest_caches()
+                removal_loss = np.bincount(nearest, weights=d_second - d_nearest, minlength=self.k)
+                n_swaps += 1
+
+            if best_swap is not None:
+                slot, candidate = best_swap
+                self.medoids[slot] = candidate
+                nearest, d_nearest, d_second = self._nearest_caches()
+                n_swaps += 1
+
+            if n_swaps == 0:
+                self.n_iter = iteration + 1
+                self.cost = current_cost
+                print(f"K-Medoids ({self.swap}) converged at iteration {iteration + 1}")
+                return
+
+        self.n_iter = self.max_iterations
+        self.labels = nearest
+        self.cost = float(np.sum(d_nearest))
+        print(f"K-Medoids ({self.swap}) reached max iterations: {self.max_iterations}")
+
+    def _fit_1d(self, X):
+        """Exact, deterministic solution for single-feature data
+
+        In 1-D Manhattan and Euclidean distances coincide, so the optimal
+        K-Medians partition with median medoids is optimal for both metrics.
+        """
+        self.labels, self.medoids, self.cost = kmedoids_1d(X[:, 0], self.k)
+        self.iteration_history.record(iteration=0, medoids=[int(m) for m in self.medoids],
+                                      medoid_points=X[self.medoids].copy(),
+                                      labels=self.labels, cost=float(self.cost))
+        self.n_iter = 1
+        print("K-Medoids solved exactly (1-D dynamic programming)")
+
+    def _assign_streaming(self, X, medoids):
+        """Label every point and total the cost against ``medoids`` in row chunks"""
+        n_samples = X.shape[0]
+        medoid_points = np.asarray(X[medoids], dtype=self.dtype)
+        labels = np.empty(n_samples, dtype=np.int64)
+        cost = 0.0
+        block = rows_per_block(len(medoids), X.shape[1], np.dtype(self.dtype).itemsize,
+                               self.memory_budget_mb)
+        for start in range(0, n_samples, block):
+            stop = min(start + block, n_samples)
+            distances = pairwise_distances(np.asarray(X[start:stop], dtype=self.dtype),
+                                           medoid_points, self.metric)
+            labels[start:stop] = np.argmin(distances, axis=1)
+            cost += float(np.sum(np.min(distances, axis=1)))
+        return labels, cost
+
+    def _fit_clara(self, X):
+        """CLARA: PAM on several random subsamples, keep the best medoids on all of X
+
+        Only a (sample_size x sample_size) matrix is ever allocated, so memory
+        no longer grows quadratically with the number of points.
+        """
+        n_samples = X.shape[0]
+        sample_size = min(n_samples, self.sample_size or 40 + 2 * self.k)
+
+        samples = [np.sort(self._rng.choice(n_samples, size=sample_size, replace=False))
+                   for _ in range(self.n_sampling)]
+
+        best_cost = None
+        for run, sample in enumerate(samples):
+            sub_model = KMedoidsManual(
+                k=self.k, max_iterations=self.max_iterations, random_state=self.random_state,
+                metric=self.metric, dtype=self.dtype, memory_budget_mb=self.memory_budget_mb,
+                swap='fasterpam' if self.swap == 'random' else self.swap, history='none'
+            )
+            sub_model.fit(X[sample])
+            medoids = sample[sub_model.medoids]
+            labels, cost = self._assign_streaming(X, medoids)
+
+            self.iteration_history.record(iteration=int(run), medoids=[int(m) for m in medoids],
+                                          medoid_points=X[medoids].copy(), labels=labels,
+                                          cost=float(cost), sample_cost=float(sub_model.cost))
+
+            if best_cost is None or cost < best_cost:
+                best_cost = cost
+                self.medoids = medoids
+                self.labels = labels
+
+        self.cost = best_cost
+        self.n_iter = len(samples)
+        print(f"K-Medoids (clara) best cost {best_cost:.4f} over {len(samples)} samples of {sample_size}")
+
+    def _medoid_distances(self, X, medoids):
+        """Distances from every point to each medoid, shape (n, k), in row chunks"""
+        n_samples = X.shape[0]
+        medoid_points = np.asarray(X[medoids], dtype=self.dtype)
+        distances = np.empty((n_samples, len(medoids)), dtype=self.dtype)
+        block = rows_per_block(len(medoids), X.shape[1], np.dtype(self.dtype).itemsize,
+                               self.memory_budget_mb)
+        for start in range(0, n_samples, block):
+            stop = min(start + block, n_samples)
+            pairwise_distances(np.asarray(X[start:stop], dtype=self.dtype), medoid_points,
+                               self.metric, out=distances[start:stop])
+        return distances
+
+    def _fit_clarans(self, X):
+        """CLARANS: randomized neighbour search over medoid sets (Ng & Han 2002)
+
+        A neighbour swaps one medoid for one random non-medoid. Its cost delta
+        is computed on demand from the distances to that single candidate plus
+        the nearest / second-nearest caches, so no n x n matrix is needed.
+        ``maxneighbor`` failed neighbours in a row end a local search;
+        ``numlocal`` local searches are run and the cheapest is kept.
+        """
+        n_samples = X.shape[0]
+        X_cast = np.asarray(X, dtype=self.dtype)
+        maxneighbor = self.maxneighbor
+        if maxneighbor is None:
+            maxneighbor = max(250, int(0.0125 * self.k * (n_samples - self.k)))
+
+        best_cost = None
+        total_swaps = 0
+        for local in range(self.numlocal):
+            medoids = self._rng.choice(n_samples, size=self.k, replace=False)
+            medoid_dist = self._medoid_distances(X, medoids)
+            nearest, d_nearest, d_second = _nearest_second(medoid_dist)
+            cost = float(np.sum(d_nearest))
+
+            failures = 0
+            while failures < maxneighbor and n_samples > self.k:
+                slot = int(self._rng.integers(self.k))
+                candidate = int(self._rng.integers(n_samples))
+                if candidate in medoids:
+                    continue
+                d_candidate = pairwise_distances(X_cast, X_cast[candidate:candidate + 1],
+                                                 self.metric).ravel()
+                # Points of the removed medoid fall back to their second medoid
+                # unless the candidate is closer; others only move if it is closer
+                fallback = np.where(nearest == slot, d_second, d_nearest)
+                delta = float(np.sum(np.minimum(d_candidate, fallback) - d_nearest))
+                if delta < -1e-12 * max(cost, 1.0):
+                    medoids[slot] = candidate
+                    medoid_dist[:, slot] = d_candidate
+                    nearest, d_nearest, d_second = _nearest_second(medoid_dist)
+                    cost = float(np.sum(d_nearest))
+                    total_swaps += 1
+                    failures = 0
+                else:
+                    failures += 1
+
+            self.iteration_history.record(iteration=int(local), medoids=[int(m) for m in medoids],
+                                          medoid_points=X[medoids].copy(), labels=nearest, cost=cost)
+
+            if best_cost is None or cost < best_cost:
+                best_cost = cost
+                self.medoids = medoids.copy()
+                self.labels = nearest
+
+        self.cost = best_cost
+        self.n_iter = self.numlocal
+        print(f"K-Medoids (clarans) best cost {best_cost:.4f} after {total_swaps} swaps "
+              f"in {self.numlocal} local searches")
+
     def predict(self, X):
-        distances = np.abs(X[self.medoids, :] - X[:, np.newaxis, :]).sum(axis=2)
+        distances = pairwise_distances(X, X[self.medoids, :], self.metric)
         return np.argmin(distances, axis=1)
 
 
 def davies_bouldin_index_manual(X, labels, medoids):
     """Calculate Davies-Bouldin Index for KMedoids"""
-    n_clusters = len(np.unique(labels))
-
-    if n_clusters <= 1:
-        return 0.0
-
-    # Calculate avg distance from points to medoid
-    S = np.zeros(n_clusters)
-    for i in range(n_clusters):
-        cluster_points = X[labels == i]
-        if len(cluster_points) > 0:
-            S[i] = np.mean(np.linalg.norm(cluster_points - X[medoids[i]], axis=1))
-
-    # Calculate Davies-Bouldin Index
-    db_index = 0.0
-    for i in range(n_clusters):
-        max_ratio = 0.0
-        for j in range(n_clusters):
-            if i != j:
-                medoid_distance = np.linalg.norm(X[medoids[i]] - X[medoids[j]])
-                if medoid_distance > 0:
-                    ratio = (S[i] + S[j]) / medoid_distance
-                    max_ratio = max(max_ratio, ratio)
-        db_index += max_ratio
-
-    return db_index / n_clusters
-
-
-def get_size_range(size_str):
-    """Extract size in cm and group by 5cm ranges"""
-    try:
-        # Extract number from "XX cm" format
-        size_num = int(size_str.replace('cm', '').strip())
-        # Group by 5cm: 0-4, 5-9, 10-14, 15-19, 20-24, etc
-        range_start = (size_num // 5) * 5
-        range_end = range_start + 4
-        return f"{range_start}-{range_end} cm"
-    except:
-        return "Unknown"
+    return davies_bouldin_index(X, labels, X[np.asarray(medoids)])
 
 
 def assign_tiers_by_percentile(df_aggregated, cluster_labels):
@@ -253,33 +640,6 @@ def assign_tiers_by_percentile(df_aggregated, cluster_labels):
     return np.array(tier_labels), df
 
 
-def aggregate_data_by_size_range(df):
-    """Aggregate data by 5cm size ranges and category before clustering"""
-    # Group by category and size range, sum the values
-    df['size_range'] = df['size'].apply(get_size_range)
-    
-    # Remove rows with Unknown size range
-    df = df[df['size_range'] != 'Unknown'].copy()
-    
-    # Aggregate by kategori and size_range
-    aggregated = df.groupby(['kategori', 'size_range']).agg({
-        'jumlah_terjual': 'sum',
-        'total_harga': 'sum',
-        'id': 'count'
-    }).reset_index()
-    
-    # Rename 'id' count to 'jumlah_transaksi'
-    aggregated.rename(columns={'id': 'jumlah_transaksi'}, inplace=True)
-    
-    # Keep track of original indices for later reference
-    aggregated['original_rows'] = aggregated.apply(
-        lambda row: df[(df['kategori'] == row['kategori']) & (df['size_range'] == row['size_range'])].index.tolist(),
-        axis=1
-    )
-    
-    return aggregated
-
-
 def analyze_clustering_results(data, labels, medoid_indices):
 
     """Analyze clustering results - Standard and Non-Standard breakdown by 5cm size ranges"""
@@ -416,41 +776,45 @@ def analyze_clustering_results_aggregated(df_aggregated, labels, medoid_indices)
     return analysis
 
 
-def process_kmedoids_manual(k=3):
-    """Process data using KMedoids clustering with 5cm size range aggregation"""
+# Above this many aggregated groups the full n x n matrix is skipped in favour of CLARA
+CLARA_THRESHOLD = 5000
+
+
+def kmedoids_fit_params(n_points, k=3, method=None, sample_size=None, n_sampling=5,
+                        numlocal=2, maxneighbor=None, n_init=1, history='none'):
+    """Constructor parameters of the fit process_kmedoids_manual saves
+
+    Shared with the iteration view, so it shows (and cached_fit reuses)
+    the same fit. ``method`` None picks CLARA above CLARA_THRESHOLD points.
+    """
+    if method is None:
+        method = 'clara' if n_points > CLARA_THRESHOLD else 'pam'
+    return {'k': k, 'max_iterations': 10, 'random_state': 42, 'swap': 'fasterpam',
+            'method': method, 'sample_size': sample_size, 'n_sampling': n_sampling,
+            'numlocal': numlocal, 'maxneighbor': maxneighbor, 'n_init': n_init,
+            'history': history}
+
+
+def process_kmedoids_manual(k=3, method=None, sample_size=None, n_sampling=5,
+                            numlocal=2, maxneighbor=None, n_init=1):
+    """Process data using KMedoids clustering with 5cm size range aggregation
+
+    ``method`` is 'pam', 'clara' or 'clarans'; when omitted, CLARA is used
+    automatically once the number of groups exceeds CLARA_THRESHOLD.
+    """
     try:
-        # Get data from database
-        data = Penjualan.query.all()
-        if not data:
+        # Aggregated, normalized features (cached until the penjualan data changes)
+        features = get_features()
+        if features is None:
             return None
-
-        # Convert to DataFrame
-        df = pd.DataFrame([{
-            'id': d.id,
-            'kategori': d.kategori,
-            'size': d.size,
-            'jumlah_terjual': d.jumlah_terjual,
-            'harga_satuan': float(d.harga_satuan) if d.harga_satuan else 0,
-            'total_harga': float(d.total_harga) if d.total_harga else 0,
-            'nama_penjual': d.nama_penjual,
-            'kota_tujuan': d.kota_tujuan
-        } for d in data])
-
-        # Aggregate data by 5cm size ranges first
-        df_aggregated = aggregate_data_by_size_range(df)
-        
-        # Prepare features for clustering (use aggregated data)
-        # ✨ CLUSTERING DENGAN 2 FITUR: jumlah_terjual dan jumlah_transaksi
-        X = df_aggregated[['jumlah_terjual', 'jumlah_transaksi']].values.astype(float)
-
-        # Normalize data
-        X_mean = X.mean(axis=0)
-        X_std = X.std(axis=0)
-        X_normalized = (X - X_mean) / (X_std + 1e-8)
-
-        # Perform KMedoids with optimized parameters
-        kmedoids = KMedoidsManual(k=k, max_iterations=10, random_state=42)
-        kmedoids.fit(X_normalized)
+        df_aggregated = features['data_aggregated']
+        X_mean, X_std = features['X_mean'], features['X_std']
+        X_normalized = features['X_normalized']
+
+        # Perform KMedoids with optimized parameters (memoized for repeat requests)
+        kmedoids = cached_fit(features, KMedoidsManual, kmedoids_fit_params(
+            len(X_normalized), k=k, method=method, sample_size=sample_size, n_sampling=n_sampling,
+            numlocal=numlocal, maxneighbor=maxneighbor, n_init=n_init))
         cluster_labels = kmedoids.labels
         
         # Use ACTUAL clustering results (not percentile override)
@@ -475,7 +839,8 @@ def process_kmedoids_manual(k=3):
             'max_iterations': kmedoids.max_iterations,  # Maximum iterations configured
             'n_samples': len(df_aggregated),
             'medoids': kmedoids.medoids,
-            'data': df,
+            'runs_summary': kmedoids.runs_summary,
+            'data_counts': features['data_counts'],
             'data_aggregated': df_aggregated,
             'analysis': analysis,
             'X_mean': X_mean,
@@ -506,7 +871,7 @@ def save_kmedoids_manual_result(result):
         kmedoids_result = result['kmedoids']
         tier_labels = result['labels']  # Tier labels for final output
         cluster_labels = result['cluster_labels']  # Original cluster labels for indexing
-        data = result['data']
+        data_counts = result['data_counts']
         data_aggregated = result['data_aggregated']
         analysis = result['analysis']
 
@@ -529,10 +894,10 @@ def save_kmedoids_manual_result(result):
             medoids=kmedoids_result.medoids.tolist(),
             cluster_distribution=cluster_dist,
             analysis_data=analysis,
-            data_kategori_count=data['kategori'].nunique(),
-            data_size_count=data['size'].nunique(),
-            data_penjual_count=data['nama_penjual'].nunique(),
-            data_kota_count=data['kota_tujuan'].nunique()
+            data_kategori_count=data_counts['kategori'],
+            data_size_count=data_counts['size'],
+            data_penjual_count=data_counts['nama_penjual'],
+            data_kota_count=data_counts['kota_tujuan']
         )
         db.session.add(result_record)
         db.session.flush()
@@ -1,10 +1,16 @@
 from flask import Blueprint, render_template, request, jsonify, current_app
 from app.processing_kmeans import process_kmeans_manual, save_kmeans_manual_result, get_kmeans_result, get_kmeans_iteration_details, save_kmeans_final_result
-from app.processing_kmedoids import process_kmedoids_manual, save_kmedoids_manual_result, get_kmedoids_result
+from app.processing_kmedoids import (process_kmedoids_manual, save_kmedoids_manual_result, get_kmedoids_result,
+                                     pairwise_distances, kmedoids_fit_params)
 from app.dbi_calculator import calculate_dbi_comparison, render_dbi_chart
 from app.analysis_formatter import format_results_display, get_data_table, format_category_analysis
 from app.models import db, Penjualan, KMeansResult, KMedoidsResult, KMeansClusterDetail, KMedoidsClusterDetail
+from app.cache import (get_features, cached_fit, memoize, dataset_fingerprint, invalidate_dataset_caches,
+                       bump_dataset_version, cache_stats)
+from app.ingest import ingest_csv
+from app.aggregates import aggregates_enabled, clear_aggregates, mark_aggregates_current
 import pandas as pd
+import numpy as np
 import os
 from werkzeug.utils import secure_filename
 import base64
@@ -110,38 +116,23 @@ def upload_csv():
         if not file.filename.endswith('.csv'):
             return jsonify({'status': 'error', 'message': 'File must be CSV format'})
 
-        # Read CSV
-        df = pd.read_csv(file)
-        
-        # Validate columns
-        required_cols = ['Kategori', 'Size', 'Jumlah_Terjual', 'Harga_Satuan', 'Total_Harga', 'Nama_Penjual', 'Kota_Tujuan']
-        missing_cols = [col for col in required_cols if col not in df.columns]
-        if missing_cols:
-            return jsonify({'status': 'error', 'message': f'Missing columns: {", ".join(missing_cols)}'})
-
-        # Clear existing data
-        Penjualan.query.delete()
-        db.session.commit()
-
-        # Insert new data
-        for idx, row in df.iterrows():
-            try:
-                penjualan = Penjualan(
-                    kategori=row['Kategori'],
-                    size=row['Size'],
-                    jumlah_terjual=int(row['Jumlah_Terjual']) if row['Jumlah_Terjual'] else 0,
-                    harga_satuan=float(str(row['Harga_Satuan']).replace('.', '')) if row['Harga_Satuan'] else 0,
-                    total_harga=float(str(row['Total_Harga']).replace('.', '')) if row['Total_Harga'] else 0,
-                    nama_penjual=row['Nama_Penjual'],
-                    kota_tujuan=row['Kota_Tujuan']
-                )
-                db.session.add(penjualan)
-            except Exception as e:
-                print(f'Error inserting row {idx}: {str(e)}')
-                continue
-
-        db.session.commit()
-        return jsonify({'status': 'success', 'message': f'✓ Upload berhasil! {len(df)} records imported'})
+        # 'replace' (default), 'append' or 'upsert' on (tanggal, kategori, size, penjual, kota)
+        mode = request.form.get('mode', 'replace')
+
+        # Stream the CSV in chunks: vectorized parsing, batched inserts, one transaction.
+        # Header padding and mixed number formats are handled per chunk
+        try:
+            report = ingest_csv(file.stream, mode=mode)
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)})
+        message = f'✓ Upload berhasil! {report["inserted"]} records imported'
+        if report['updated']:
+            message += f', {report["updated"]} records diperbarui'
+        if report['duplicates_merged']:
+            message += f', {report["duplicates_merged"]} baris duplikat digabung'
+        if report['error_count']:
+            message += f' ({report["error_count"]} baris tidak valid dilewati)'
+        return jsonify({'status': 'success', 'message': message, **report})
 
     except Exception as e:
         db.session.rollback()
@@ -172,12 +163,29 @@ def preprocessing_kmeans():
     return render_template('preprocessing_kmeans.html', active_page='kmeans', results=results)
 
 
+# Most restarts one request may ask for (each is a full fit in a worker process)
+MAX_N_INIT = 10
+
+
+def _out_of_range(params, high):
+    """Error response for the first form parameter outside 1..high (None values are skipped), else None"""
+    for name, value in params.items():
+        if value is not None and not 1 <= value <= high[name]:
+            return jsonify({'status': 'error',
+                            'error': f'{name} harus antara 1 dan {high[name]}'}), 400
+    return None
+
+
 # Preprocessing KMeans - POST (run clustering)
 @main.route('/preprocessing/kmeans', methods=['POST'])
 def process_kmeans():
     try:
         k = request.form.get('k', 3, type=int)
-        result = process_kmeans_manual(k=k)
+        n_init = request.form.get('n_init', 1, type=int)
+        error = _out_of_range({'n_init': n_init}, {'n_init': MAX_N_INIT})
+        if error:
+            return error
+        result = process_kmeans_manual(k=k, n_init=n_init)
         if result:
             save_kmeans_manual_result(result)
             
@@ -196,103 +204,111 @@ def process_kmeans():
                 'n_iter': int(result.get('n_iter', 0)),
                 'max_iterations': int(result.get('max_iterations', 10)),
                 'analysis': result.get('analysis', {}),
-                'cluster_distribution': tier_distribution
+                'cluster_distribution': tier_distribution,
+                'runs_summary': result.get('runs_summary', [])
             })
         return jsonify({'status': 'error', 'error': 'Failed to process data'})
     except Exception as e:
         return jsonify({'status': 'error', 'error': str(e)})
 
 
+# Points per page of an iteration's distance table
+ITERATION_PAGE_SIZE = 500
+
+
+def _format_centers(centers):
+    """Centers as objects with cluster info (in normalized feature units)"""
+    return [{
+        'cluster_id': int(c_id),
+        'jumlah_terjual': float(center[0]),
+        'jumlah_transaksi': float(center[1])
+    } for c_id, center in enumerate(centers)]
+
+
+def _distance_columns(X_normalized, centers):
+    """Euclidean distance of every point to every center in one broadcast, one list per cluster"""
+    distances = pairwise_distances(X_normalized, np.asarray(centers, dtype=float), metric='euclidean')
+    return {f'C{c_id}': np.round(distances[:, c_id], 6).tolist() for c_id in range(distances.shape[1])}
+
+
+def _point_columns(df_aggregated):
+    """Point attributes shown next to the distances, as columns (sent once, not per iteration)"""
+    return {
+        'kategori': df_aggregated['kategori'].tolist(),
+        'size_range': df_aggregated['size_range'].tolist(),
+        'jumlah_terjual': df_aggregated['jumlah_terjual'].astype(int).tolist()
+    }
+
+
+def _iterations_page(iterations, X_normalized, df_aggregated):
+    """JSON page of an iteration history: ?iter=<n>&offset=<row>&limit=<rows>
+
+    ``iterations`` holds (payload, centers, labels) per iteration. Without
+    ``iter`` every iteration is returned; either way only points
+    [offset, offset + limit) are included, and their distances are computed
+    here from the stored centers instead of being kept with the history.
+    """
+    iteration = request.args.get('iter', None, type=int)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = max(request.args.get('limit', ITERATION_PAGE_SIZE, type=int), 0)
+    rows = slice(offset, offset + limit)
+
+    selected = [item for item in iterations if iteration is None or item[0]['iteration'] == iteration]
+    if iteration is not None and not selected:
+        return jsonify({'status': 'error', 'message': f'Iteration {iteration} not found'})
+
+    page = []
+    for payload, centers, labels in selected:
+        payload = dict(payload)
+        payload['labels'] = np.asarray(labels)[rows].tolist()
+        payload['cluster_distances'] = _distance_columns(X_normalized[rows], centers)
+        page.append(payload)
+
+    return jsonify({
+        'status': 'success',
+        'iterations': page,
+        'points': _point_columns(df_aggregated.iloc[rows]),
+        'offset': offset,
+        'limit': limit,
+        'total_iterations': len(iterations),
+        'data_count': len(df_aggregated)
+    })
+
+
 # Preprocessing KMeans - Get iteration details
 @main.route('/preprocessing/kmeans/iterations', methods=['GET'])
 def kmeans_iterations():
-    """Get detailed iteration steps for KMeans clustering"""
+    """Get detailed iteration steps for KMeans clustering (paginated, see _iterations_page)"""
     try:
-        from app.processing_kmeans import KMeansManual, analyze_clustering_results, aggregate_data_by_size_range, convert_numpy_types
-        from scipy.spatial.distance import euclidean
-        import numpy as np
+        from app.processing_kmeans import KMeansManual
         
-        # Get all data
-        data = Penjualan.query.all()
-        if not data:
-            return jsonify({'status': 'error', 'message': 'No data available'})
-        
-        # Convert to DataFrame
-        df = pd.DataFrame([{
-            'id': d.id,
-            'kategori': d.kategori,
-            'size': d.size,
-            'jumlah_terjual': float(d.jumlah_terjual),
-            'total_harga': float(d.total_harga) if d.total_harga else 0
-        } for d in data])
-        
-        # Aggregate data by 5cm size ranges like in process_kmeans_manual
-        df_aggregated = aggregate_data_by_size_range(df)
-        
-        # Prepare features for clustering (aggregated data)
+        # Aggregated, normalized features like in process_kmeans_manual (cached)
         # ✨ CLUSTERING DENGAN 2 FITUR: jumlah_terjual dan jumlah_transaksi
-        X = df_aggregated[['jumlah_terjual', 'jumlah_transaksi']].values.astype(float)
-        
-        # Normalize data
-        X_mean = X.mean(axis=0)
-        X_std = X.std(axis=0)
-        X_normalized = (X - X_mean) / (X_std + 1e-8)
+        features = get_features()
+        if features is None:
+            return jsonify({'status': 'error', 'message': 'No data available'})
+        df_aggregated = features['data_aggregated']
+        X_normalized = features['X_normalized']
         
-        # Run KMeans with tracking
-        kmeans = KMeansManual(k=3, max_iterations=100, random_state=42)
-        kmeans.fit(X_normalized)
+        # Run KMeans with tracking (memoized until the data changes)
+        kmeans = cached_fit(features, KMeansManual, {'k': 3, 'max_iterations': 100, 'random_state': 42})
         
-        # Enrich iteration history with cluster assignments and distances
+        # Centers and labels per iteration; distances are computed per requested page
         iterations = []
-        if kmeans.iteration_history:
-            for iter_data in kmeans.iteration_history:
-                # Skip initial iteration (no labels yet)
-                if iter_data['labels'] is None:
-                    continue
-                
-                # Calculate distances from each point to each centroid
-                centroids = iter_data['centroids']
-                labels = iter_data['labels']
-                
-                # Format centroids as objects with cluster info
-                centroids_formatted = []
-                for c_id, centroid in enumerate(centroids):
-                    centroids_formatted.append({
-                        'cluster_id': int(c_id),
-                        'jumlah_terjual': float(centroid[0]),
-                        'jumlah_transaksi': float(centroid[1])
-                    })
-                
-                cluster_assignments = []
-                for idx, row in df_aggregated.iterrows():
-                    distances = {}
-                    for c_id, centroid in enumerate(centroids):
-                        dist = euclidean(X_normalized[idx], centroid)
-                        distances[f'C{c_id}'] = float(dist)
-                    
-                    cluster_assignments.append({
-                        'kategori': row['kategori'],
-                        'size_range': row['size_range'],
-                        'jumlah_terjual': int(row['jumlah_terjual']),
-                        'distances': distances,
-                        'assigned_cluster': f"C{int(labels[idx])}"
-                    })
-                
-                # Convert for JSON serialization
-                iter_data_copy = iter_data.copy()
-                iter_data_copy['centroids'] = centroids_formatted
-                iter_data_copy['labels'] = labels.tolist() if hasattr(labels, 'tolist') else labels
-                if iter_data_copy.get('distances') is not None:
-                    iter_data_copy['distances'] = iter_data_copy['distances'].tolist() if hasattr(iter_data_copy['distances'], 'tolist') else iter_data_copy['distances']
-                iter_data_copy['cluster_assignments'] = cluster_assignments
-                iterations.append(iter_data_copy)
+        for iter_data in kmeans.iteration_history:
+            # Skip initial iteration (no labels yet)
+            if iter_data['labels'] is None:
+                continue
+            
+            centroids = np.asarray(iter_data['centroids'])
+            payload = {
+                'iteration': iter_data['iteration'],
+                'centroids': _format_centers(centroids),
+                'skipped_distance_evaluations': iter_data.get('skipped_distance_evaluations', 0)
+            }
+            iterations.append((payload, centroids, iter_data['labels']))
         
-        return jsonify({
-            'status': 'success',
-            'iterations': iterations,
-            'total_iterations': len(iterations),
-            'data_count': len(df_aggregated)
-        })
+        return _iterations_page(iterations, X_normalized, df_aggregated)
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -352,7 +368,25 @@ def preprocessing_kmedoids():
 def process_kmedoids():
     try:
         k = request.form.get('k', 3, type=int)
-        result = process_kmedoids_manual(k=k)
+        method = request.form.get('method') or None
+        sample_size = request.form.get('sample_size', None, type=int)
+        n_sampling = request.form.get('n_sampling', 5, type=int)
+        numlocal = request.form.get('numlocal', 2, type=int)
+        maxneighbor = request.form.get('maxneighbor', None, type=int)
+        n_init = request.form.get('n_init', 1, type=int)
+
+        # Sampling parameters cannot exceed the number of aggregated points
+        features = get_features()
+        n_points = len(features['X_normalized']) if features is not None else 0
+        error = _out_of_range(
+            {'n_init': n_init, 'sample_size': sample_size, 'n_sampling': n_sampling,
+             'numlocal': numlocal, 'maxneighbor': maxneighbor},
+            {'n_init': MAX_N_INIT, 'sample_size': n_points, 'n_sampling': n_points,
+             'numlocal': n_points, 'maxneighbor': n_points})
+        if error:
+            return error
+        result = process_kmedoids_manual(k=k, method=method, sample_size=sample_size, n_sampling=n_sampling,
+                                         numlocal=numlocal, maxneighbor=maxneighbor, n_init=n_init)
         if result:
             save_kmedoids_manual_result(result)
             
@@ -368,7 +402,8 @@ def process_kmedoids():
                 'max_iterations': int(result.get('max_iterations', 10)),
                 'medoids': result.get('medoids', []).tolist() if hasattr(result.get('medoids', []), 'tolist') else result.get('medoids', []),
                 'analysis': result.get('analysis', {}),
-                'cluster_distribution': tier_distribution
+                'cluster_distribution': tier_distribution,
+                'runs_summary': result.get('runs_summary', [])
             })
         return jsonify({'status': 'error', 'error': 'Failed to process data'})
     except Exception as e:
@@ -378,87 +413,30 @@ def process_kmedoids():
 # Preprocessing KMedoids - GET iteration details
 @main.route('/preprocessing/kmedoids/iterations', methods=['GET'])
 def kmedoids_iterations():
-    """Get detailed iteration steps for KMedoids clustering with aggregated data"""
+    """Get detailed iteration steps for KMedoids clustering with aggregated data (paginated)"""
     try:
-        from app.processing_kmedoids import KMedoidsManual, aggregate_data_by_size_range
-        import numpy as np
-        from scipy.spatial.distance import euclidean
-        
-        # Get all data
-        data = Penjualan.query.all()
-        if not data:
-            return jsonify({'status': 'error', 'message': 'No data available'})
+        from app.processing_kmedoids import KMedoidsManual
         
-        # Convert to DataFrame
-        df = pd.DataFrame([{
-            'id': d.id,
-            'kategori': d.kategori,
-            'size': d.size,
-            'jumlah_terjual': float(d.jumlah_terjual),
-            'total_harga': float(d.total_harga) if d.total_harga else 0
-        } for d in data])
-        
-        # Aggregate data by 5cm size ranges like in process_kmedoids_manual
-        df_aggregated = aggregate_data_by_size_range(df)
-        
-        # Prepare features for clustering (aggregated data)
+        # Aggregated, normalized features like in process_kmedoids_manual (cached)
         # ✨ CLUSTERING DENGAN 2 FITUR: jumlah_terjual dan jumlah_transaksi
-        X = df_aggregated[['jumlah_terjual', 'jumlah_transaksi']].values.astype(float)
-        
-        # Normalize data
-        X_mean = X.mean(axis=0)
-        X_std = X.std(axis=0)
-        X_normalized = (X - X_mean) / (X_std + 1e-8)
+        features = get_features()
+        if features is None:
+            return jsonify({'status': 'error', 'message': 'No data available'})
+        df_aggregated = features['data_aggregated']
+        X_normalized = features['X_normalized']
         
-        # Run KMedoids with tracking
-        kmedoids = KMedoidsManual(k=3, max_iterations=100, random_state=42)
-        kmedoids.fit(X_normalized)
+        # The fit process_kmedoids_manual saves (FasterPAM), recorded in full (memoized until the data changes)
+        kmedoids = cached_fit(features, KMedoidsManual, kmedoids_fit_params(len(X_normalized), history='full'))
         
-        # Enrich iteration history with cluster assignments and distances
+        # Medoids and labels per iteration; distances are computed per requested page
         iterations = []
-        if kmedoids.iteration_history:
-            for iter_data in kmedoids.iteration_history:
-                # Calculate distances from each point to each medoid
-                medoid_points = iter_data['medoid_points']
-                labels = iter_data['labels']
-                
-                # Format medoids as objects with cluster info
-                medoids_formatted = []
-                for c_id, medoid in enumerate(medoid_points):
-                    medoids_formatted.append({
-                        'cluster_id': int(c_id),
-                        'jumlah_terjual': float(medoid[0]),
-                        'jumlah_transaksi': float(medoid[1])
-                    })
-                
-                cluster_assignments = []
-                for idx, row in df_aggregated.iterrows():
-                    distances = {}
-                    for c_id, medoid_point in enumerate(medoid_points):
-                        dist = euclidean(X_normalized[idx], medoid_point)
-                        distances[f'C{c_id}'] = float(dist)
-                    
-                    cluster_assignments.append({
-                        'kategori': row['kategori'],
-                        'size_range': row['size_range'],
-                        'jumlah_terjual': int(row['jumlah_terjual']),
-                        'distances': distances,
-                        'assigned_cluster': f"C{int(labels[idx])}"
-                    })
-                
-                # Convert to JSON-serializable format
-                iter_data_copy = iter_data.copy()
-                iter_data_copy['medoid_points'] = medoids_formatted
-                iter_data_copy['labels'] = labels.tolist() if hasattr(labels, 'tolist') else labels
-                iter_data_copy['cluster_assignments'] = cluster_assignments
-                iterations.append(iter_data_copy)
+        for iter_data in kmedoids.iteration_history:
+            medoid_points = np.asarray(iter_data['medoid_points'])
+            payload = {key: value for key, value in iter_data.items() if key not in ('labels', 'medoid_points')}
+            payload['medoid_points'] = _format_centers(medoid_points)
+            iterations.append((payload, medoid_points, iter_data['labels']))
         
-        return jsonify({
-            'status': 'success',
-            'iterations': iterations,
-            'total_iterations': len(iterations),
-            'data_count': len(df_aggregated)
-        })
+        return _iterations_page(iterations, X_normalized, df_aggregated)
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -471,7 +449,14 @@ def delete_data():
     try:
         # Delete all from penjualan table
         Penjualan.query.delete()
+        maintain_aggregates = aggregates_enabled()
+        if maintain_aggregates:
+            clear_aggregates()
+        bump_dataset_version()
+        if maintain_aggregates:
+            mark_aggregates_current()
         db.session.commit()
+        invalidate_dataset_caches()
         return jsonify({'status': 'success', 'message': 'All data deleted successfully'})
     except Exception as e:
         db.session.rollback()
@@ -507,9 +492,10 @@ def results():
     kmeans = get_kmeans_result()
     kmedoids = get_kmedoids_result()
     
-    # Format results for display
+    # Format results for display (memoized per saved result pair and dataset)
     if kmeans and kmedoids:
-        formatted_results = format_results_display(kmeans, kmedoids)
+        formatted_results = memoize(('results', dataset_fingerprint(), kmeans['id'], kmedoids['id']),
+                                    lambda: format_results_display(kmeans, kmedoids))
     else:
         formatted_results = None
     
@@ -518,6 +504,12 @@ def results():
                          formatted_results=formatted_results)
 
 
+# Cache hit / miss counters
+@main.route('/cache/stats')
+def cache_statistics():
+    return jsonify(cache_stats())
+
+
 # Davies-Bouldin Index Comparison
 @main.route('/dbi', methods=['GET', 'POST'])
 def dbi_comparison():
@@ -558,13 +550,8 @@ def dbi_comparison():
                 'message': 'Failed to render chart'
             })
         
-        return jsonify({
-            'status': 'success',
-            'list_k': result['list_k'],
-            'list_dbi_kmeans': result['list_dbi_kmeans'],
-            'list_dbi_kmedoids': result['list_dbi_kmedoids'],
-            'chart': chart_base64
-        })
+        result['chart'] = chart_base64
+        return jsonify(result)
     
     except Exception as e:
         return jsonify({
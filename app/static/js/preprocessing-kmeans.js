@@ -496,7 +496,8 @@ document.getElementById('reset-btn').addEventListener('click', async function()
 // Function to load and display iterations
 async function loadAndDisplayIterations() {
     try {
-        const response = await fetch('/preprocessing/kmeans/iterations');
+        // Only the first 15 points of each iteration are shown
+        const response = await fetch('/preprocessing/kmeans/iterations?limit=15');
         const data = await response.json();
 
         if (data.status === 'success') {
@@ -507,7 +508,7 @@ async function loadAndDisplayIterations() {
                     finalCentroids = lastIteration.centroids;
                 }
             }
-            displayIterations(data.iterations);
+            displayIterations(data.iterations, data.points);
             document.getElementById('iterations-container').classList.remove('d-none');
             
             // NOW display final results AFTER centroids are loaded
@@ -523,7 +524,8 @@ async function loadAndDisplayIterations() {
 }
 
 // Function to display iterations
-function displayIterations(iterations) {
+// points: columns (kategori, size_range, jumlah_terjual) shared by all iterations
+function displayIterations(iterations, points) {
     const iterationsList = document.getElementById('iterations-list');
     let html = '';
 
@@ -568,7 +570,7 @@ function displayIterations(iterations) {
         }
 
         // Tampilkan Distance Table
-        if (iter.cluster_assignments && iter.cluster_assignments.length > 0) {
+        if (iter.cluster_distances && iter.labels && iter.labels.length > 0) {
             html += `
                 <div class="distance-section">
                     <div class="distance-title">📏 Jarak Euclidean ke Setiap Centroid</div>
@@ -588,20 +590,21 @@ function displayIterations(iterations) {
                             <tbody>
             `;
 
-            iter.cluster_assignments.slice(0, 15).forEach((assignment) => {
-                const clusterClass = `c${assignment.assigned_cluster.toLowerCase().replace('c', '')}`;
+            const distances = iter.cluster_distances;
+            for (let i = 0; i < Math.min(15, iter.labels.length); i++) {
+                const clusterClass = `c${iter.labels[i]}`;
                 html += `
                     <tr>
-                        <td>${assignment.kategori}</td>
-                        <td>${assignment.size_range}</td>
-                        <td>${assignment.jumlah_terjual.toFixed(0)}</td>
-                        <td class="distance-value">${assignment.distances['C0'].toFixed(3)}</td>
-                        <td class="distance-value">${assignment.distances['C1'].toFixed(3)}</td>
-                        <td class="distance-value">${assignment.distances['C2'].toFixed(3)}</td>
-                        <td><span class="cluster-badge ${clusterClass}">${assignment.assigned_cluster}</span></td>
+                        <td>${points.kategori[i]}</td>
+                        <td>${points.size_range[i]}</td>
+                        <td>${points.jumlah_terjual[i].toFixed(0)}</td>
+                        <td class="distance-value">${distances['C0'][i].toFixed(3)}</td>
+                        <td class="distance-value">${distances['C1'][i].toFixed(3)}</td>
+                        <td class="distance-value">${distances['C2'][i].toFixed(3)}</td>
+                        <td><span class="cluster-badge ${clusterClass}">C${iter.labels[i]}</span></td>
                     </tr>
                 `;
-            });
+            }
 
             html += `
                             </tbody>
@@ -280,7 +280,8 @@ function displayFinalResults(analysis) {
 // Load and display iterations
 async function loadAndDisplayIterations() {
     try {
-        const response = await fetch('/preprocessing/kmedoids/iterations');
+        // Only the first 15 points of each iteration are shown
+        const response = await fetch('/preprocessing/kmedoids/iterations?limit=15');
         const data = await response.json();
 
         if (data.status === 'success') {
@@ -292,7 +293,7 @@ async function loadAndDisplayIterations() {
                 if (lastIteration.medoid_points) {
                     finalMedoids = lastIteration.medoid_points;
                 }
-                renderIterations(iterations);
+                renderIterations(iterations, data.points);
                 document.getElementById('iterations-container').classList.remove('d-none');
                 
                 // NOW display final results AFTER medoids are loaded
@@ -309,7 +310,8 @@ async function loadAndDisplayIterations() {
 }
 
 // Render iterations
-function renderIterations(iterations) {
+// points: columns (kategori, size_range, jumlah_terjual) shared by all iterations
+function renderIterations(iterations, points) {
     const listContainer = document.getElementById('iterations-list');
     listContainer.innerHTML = '';
 
@@ -366,7 +368,7 @@ function renderIterations(iterations) {
         }
 
         // Tampilkan Distance Table
-        if (iteration.cluster_assignments && iteration.cluster_assignments.length > 0) {
+        if (iteration.cluster_distances && iteration.labels && iteration.labels.length > 0) {
             html += `
                 <div class="distance-section" style="margin-top: 1.5rem;">
                     <div class="distance-title" style="font-size: 1rem; font-weight: 600; margin-bottom: 1rem; color: #333;">📏 Jarak Euclidean ke Setiap Medoid</div>
@@ -386,21 +388,22 @@ function renderIterations(iterations) {
                             <tbody>
             `;
 
-            iteration.cluster_assignments.slice(0, 15).forEach((assignment, rowIdx) => {
-                const clusterClass = `c${assignment.assigned_cluster.toLowerCase().replace('c', '')}`;
+            const distances = iteration.cluster_distances;
+            const formatDistance = (column, rowIdx) => column && column[rowIdx] ? parseFloat(column[rowIdx]).toFixed(3) : '0.000';
+            for (let rowIdx = 0; rowIdx < Math.min(15, iteration.labels.length); rowIdx++) {
                 const bgColor = rowIdx % 2 === 0 ? 'white' : '#f9f9f9';
                 html += `
                     <tr style="background-color: ${bgColor}; border-bottom: 1px solid #dee2e6;">
-                        <td style="padding: 0.75rem;">${assignment.kategori}</td>
-                        <td style="padding: 0.75rem;">${assignment.size_range}</td>
-                        <td style="padding: 0.75rem; text-align: right; font-weight: 500;">${assignment.jumlah_terjual}</td>
-                        <td style="padding: 0.75rem; text-align: center; font-family: monospace; color: #666;">${assignment.distances['C0'] ? parseFloat(assignment.distances['C0']).toFixed(3) : '0.000'}</td>
-                        <td style="padding: 0.75rem; text-align: center; font-family: monospace; color: #666;">${assignment.distances['C1'] ? parseFloat(assignment.distances['C1']).toFixed(3) : '0.000'}</td>
-                        <td style="padding: 0.75rem; text-align: center; font-family: monospace; color: #666;">${assignment.distances['C2'] ? parseFloat(assignment.distances['C2']).toFixed(3) : '0.000'}</td>
-                        <td style="padding: 0.75rem; text-align: center;"><span class="badge bg-success" style="padding: 0.4rem 0.6rem; font-size: 0.8rem;">${assignment.assigned_cluster}</span></td>
+                        <td style="padding: 0.75rem;">${points.kategori[rowIdx]}</td>
+                        <td style="padding: 0.75rem;">${points.size_range[rowIdx]}</td>
+                        <td style="padding: 0.75rem; text-align: right; font-weight: 500;">${points.jumlah_terjual[rowIdx]}</td>
+                        <td style="padding: 0.75rem; text-align: center; font-family: monospace; color: #666;">${formatDistance(distances['C0'], rowIdx)}</td>
+                        <td style="padding: 0.75rem; text-align: center; font-family: monospace; color: #666;">${formatDistance(distances['C1'], rowIdx)}</td>
+                        <td style="padding: 0.75rem; text-align: center; font-family: monospace; color: #666;">${formatDistance(distances['C2'], rowIdx)}</td>
+                        <td style="padding: 0.75rem; text-align: center;"><span class="badge bg-success" style="padding: 0.4rem 0.6rem; font-size: 0.8rem;">C${iteration.labels[rowIdx]}</span></td>
                     </tr>
                 `;
-            });
+            }
 
             html += `
                             </tbody>
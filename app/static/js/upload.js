@@ -34,6 +34,7 @@ uploadForm.addEventListener('submit', async (e) => {
     
     const formData = new FormData();
     formData.append('file', fileInput.files[0]);
+    formData.append('mode', document.getElementById('uploadMode').value);
 
     const uploadBtn = document.getElementById('uploadBtn');
     const originalText = uploadBtn.innerHTML;
@@ -1,57 +1,32 @@
 """
 Helper script to import CSV data into database
 """
-import pandas as pd
 import sys
 sys.path.insert(0, r'c:\Users\LENOVO\Documents\Project_Ta_Skripsi')
 
 from app import create_app
-from app.models import db, Penjualan
+from app.models import Penjualan
+from app.ingest import ingest_csv
 
 app = create_app()
 
-def import_csv(csv_path):
-    """Import CSV file into database"""
+def import_csv(csv_path, mode='replace'):
+    """Import CSV file into database ('replace', 'append' or 'upsert')"""
     with app.app_context():
         try:
             print(f"Reading CSV: {csv_path}")
-            df = pd.read_csv(csv_path)
-            print(f"Total rows: {len(df)}")
-            
-            # Clear existing data
-            Penjualan.query.delete()
-            db.session.commit()
-            print("✓ Cleared existing data")
-            
-            # Insert data
-            success_count = 0
-            for idx, row in df.iterrows():
-                try:
-                    # Parse harga (remove dots)
-                    harga_satuan = str(row['Harga_Satuan']).replace('.', '') if row['Harga_Satuan'] else '0'
-                    total_harga = str(row['Total_Harga']).replace('.', '') if row['Total_Harga'] else '0'
-                    
-                    penjualan = Penjualan(
-                        kategori=row['Kategori'],
-                        size=row['Size'],
-                        jumlah_terjual=int(row['Jumlah_Terjual']) if row['Jumlah_Terjual'] else 0,
-                        harga_satuan=float(harga_satuan),
-                        total_harga=float(total_harga),
-                        nama_penjual=row['Nama_Penjual'],
-                        kota_tujuan=row['Kota_Tujuan']
-                    )
-                    db.session.add(penjualan)
-                    success_count += 1
-                    
-                    if idx % 100 == 0:
-                        print(f"  Processed {idx} rows...")
-                        
-                except Exception as e:
-                    print(f"  ⚠ Error row {idx}: {str(e)}")
-                    continue
-            
-            db.session.commit()
-            print(f"✅ Imported {success_count} records successfully!")
+            # Streamed in chunks (vectorized parsing, batched inserts, one transaction)
+            report = ingest_csv(csv_path, mode=mode)
+            print(f"Total rows: {report['total_rows']}")
+            for error in report['errors']:
+                print(f"  ⚠ Error row {error['row']}: {error['message']} ({error['value']!r})")
+            if report['error_count'] > len(report['errors']):
+                print(f"  ... {report['error_count'] - len(report['errors'])} more invalid rows")
+            if report['duplicates_merged']:
+                print(f"  ⚠ {report['duplicates_merged']} duplicate rows merged into a later row with the same key")
+            print(f"✅ Imported {report['inserted']} records successfully!")
+            if report['updated']:
+                print(f"✅ Updated {report['updated']} existing records")
             
             # Show stats
             total = Penjualan.query.count()
@@ -69,4 +44,4 @@ def import_csv(csv_path):
 
 if __name__ == '__main__':
     csv_file = r'c:\Users\LENOVO\Documents\Project_Ta_Skripsi\upload\hasil_data_Penjualan_CvPutraRizkyAroindo_2023-2025.csv'
-    import_csv(csv_file)
+    import_csv(csv_file, mode=sys.argv[1] if len(sys.argv) > 1 else 'replace')
@@ -0,0 +1,44 @@
+"""
+Migration script to add the dataset_version table
+Run this script once: the clustering caches are then keyed by this single-row
+counter (bumped by every upload / delete) instead of a checksum scan of penjualan
+"""
+
+from app import create_app
+from app.models import db, DatasetVersion, DATASET_VERSION_ID
+from sqlalchemy import inspect
+import sys
+
+app = create_app()
+
+def main():
+    """Run the migration"""
+    print("=" * 60)
+    print("Database Migration: Add dataset_version table")
+    print("=" * 60)
+    print()
+
+    with app.app_context():
+        try:
+            if inspect(db.engine).has_table(DatasetVersion.__tablename__):
+                print("✓ Table 'dataset_version' already exists")
+            else:
+                DatasetVersion.__table__.create(db.engine)
+                print("✓ Successfully created table 'dataset_version'")
+
+            if db.session.get(DatasetVersion, DATASET_VERSION_ID) is None:
+                db.session.add(DatasetVersion(id=DATASET_VERSION_ID, version=1))
+                db.session.commit()
+                print("✓ Initialized dataset version")
+        except Exception as e:
+            db.session.rollback()
+            print(f"✗ Migration failed: {str(e)}")
+            sys.exit(1)
+
+        print()
+        print("=" * 60)
+        print("✓ Migration completed successfully!")
+        print("=" * 60)
+
+if __name__ == '__main__':
+    main()
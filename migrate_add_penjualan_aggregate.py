@@ -0,0 +1,111 @@
+"""
+Migration script to add the penjualan_aggregate and penjualan_value_count tables
+Run this script once to enable append / upsert uploads with incremental aggregation:
+it creates the tables and dataset_version.aggregates_version, indexes
+penjualan.tanggal_terjual (used by upsert lookups) and fills the aggregates
+from the existing penjualan rows
+"""
+
+from app import create_app
+from app.models import db, Penjualan, PenjualanAggregate, PenjualanValueCount, DatasetVersion
+from app.aggregates import rebuild_aggregates, mark_aggregates_current, aggregates_current
+from sqlalchemy import inspect, text
+import sys
+
+app = create_app()
+
+def create_table_if_not_exists(model):
+    """Create the model's table if it doesn't exist"""
+    if inspect(db.engine).has_table(model.__tablename__):
+        print(f"✓ Table '{model.__tablename__}' already exists")
+        return False
+    model.__table__.create(db.engine)
+    print(f"✓ Successfully created table '{model.__tablename__}'")
+    return True
+
+def drop_group_unique_constraint():
+    """Drop uq_penjualan_aggregate_group (case-insensitive, rejects groups differing only in case)"""
+    name = 'uq_penjualan_aggregate_group'
+    inspector = inspect(db.engine)
+    existing = ({c['name'] for c in inspector.get_unique_constraints(PenjualanAggregate.__tablename__)}
+                | {index['name'] for index in inspector.get_indexes(PenjualanAggregate.__tablename__)})
+    if name not in existing:
+        print(f"✓ Constraint '{name}' not present")
+        return False
+    with db.engine.begin() as connection:
+        connection.execute(text(f"ALTER TABLE penjualan_aggregate DROP INDEX {name}"))
+    print(f"✓ Successfully dropped constraint '{name}'")
+    return True
+
+def add_aggregates_version_column():
+    """Add dataset_version.aggregates_version if it doesn't exist"""
+    columns = [col['name'] for col in inspect(db.engine).get_columns(DatasetVersion.__tablename__)]
+    if 'aggregates_version' in columns:
+        print("✓ Column 'aggregates_version' already exists")
+        return False
+    with db.engine.begin() as connection:
+        connection.execute(text("ALTER TABLE dataset_version ADD COLUMN aggregates_version BIGINT NULL"))
+    print("✓ Successfully added column 'aggregates_version'")
+    return True
+
+def create_date_index_if_not_exists():
+    """Index penjualan.tanggal_terjual (natural key lookups in upsert mode)"""
+    existing = {index['name'] for index in inspect(db.engine).get_indexes(Penjualan.__tablename__)}
+    for index in Penjualan.__table__.indexes:
+        if index.name in existing:
+            print(f"✓ Index '{index.name}' already exists")
+            continue
+        index.create(db.engine)
+        print(f"✓ Successfully created index '{index.name}'")
+
+def main():
+    """Run the migration"""
+    print("=" * 60)
+    print("Database Migration: Add penjualan_aggregate / penjualan_value_count tables")
+    print("=" * 60)
+    print()
+
+    with app.app_context():
+        try:
+            print("1. Creating tables: penjualan_aggregate, penjualan_value_count")
+            print("-" * 60)
+            if not create_table_if_not_exists(PenjualanAggregate):
+                drop_group_unique_constraint()
+            create_table_if_not_exists(PenjualanValueCount)
+            if not create_table_if_not_exists(DatasetVersion):
+                add_aggregates_version_column()
+            print()
+
+            print("2. Indexing table: penjualan")
+            print("-" * 60)
+            create_date_index_if_not_exists()
+            print()
+
+            print("3. Filling aggregates from existing penjualan rows")
+            print("-" * 60)
+            total = rebuild_aggregates()
+            mark_aggregates_current()
+            db.session.commit()
+            groups = PenjualanAggregate.query.count()
+            print(f"✓ Aggregated {total} penjualan rows into {groups} groups")
+            print()
+        except Exception as e:
+            db.session.rollback()
+            print(f"✗ Migration failed: {str(e)}")
+            sys.exit(1)
+
+        # Verify changes
+        print("=" * 60)
+        if aggregates_current():
+            print("✓ Migration completed successfully!")
+            print("=" * 60)
+            print()
+            print("Uploads now keep penjualan_aggregate up to date, and clustering")
+            print("reads the aggregated rows instead of scanning penjualan.")
+        else:
+            print("✗ penjualan_aggregate is not marked current - please check errors above")
+            print("=" * 60)
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
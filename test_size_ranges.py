@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""Size parsing check: vectorized add_size_columns must match the per-row parser
+
+The per-row get_size_range the pipelines used before add_size_columns is
+copied here verbatim, and both are run on the sample CSV plus the edge
+cases it accepted or rejected. Runs under pytest or as a plain script.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pandas as pd
+
+from app.preprocessing import add_size_columns, get_size_range
+
+SAMPLE_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'upload',
+                          'hasil_data_Penjualan_CvPutraRizkyAroindo_2023-2025.csv')
+
+# Accepted and rejected forms of the original parser
+EDGE_CASES = ['20 cm', '20cm', ' 20 cm ', 'cm20', '2cm0', '20 cm cm', '+20', '-7 cm', '1_0 cm', '٢٠ cm',
+              '20 CM', '20 Cm', '20.5 cm', '2 0', '', 'cm', 'abc', None, np.nan, 20, 20.0]
+
+
+def original_get_size_range(size_str):
+    """Extract size in cm and group by 5cm ranges"""
+    try:
+        # Extract number from "XX cm" format
+        size_num = int(size_str.replace('cm', '').strip())
+        # Group by 5cm: 0-4, 5-9, 10-14, 15-19, 20-24, etc
+        range_start = (size_num // 5) * 5
+        range_end = range_start + 4
+        return f"{range_start}-{range_end} cm"
+    except:
+        return "Unknown"
+
+
+def load_sizes():
+    df = pd.read_csv(SAMPLE_CSV, dtype=str)
+    df.columns = [str(col).strip() for col in df.columns]
+    return pd.concat([df['Size'], pd.Series(EDGE_CASES, dtype=object)], ignore_index=True)
+
+
+def test_add_size_columns_matches_per_row_parser():
+    sizes = load_sizes()
+    vectorized = add_size_columns(pd.DataFrame({'size': sizes}))['size_range'].astype(str).tolist()
+    assert vectorized == [original_get_size_range(size) for size in sizes]
+
+
+def test_get_size_range_matches_per_row_parser():
+    for size in load_sizes():
+        assert get_size_range(size) == original_get_size_range(size), size
+
+
+if __name__ == '__main__':
+    print("=" * 80)
+    print("Size range parsing")
+    print("=" * 80)
+    test_add_size_columns_matches_per_row_parser()
+    print("✓ add_size_columns matches the per-row parser on the sample CSV")
+    test_get_size_range_matches_per_row_parser()
+    print("✓ get_size_range matches the per-row parser")